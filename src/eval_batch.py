@@ -0,0 +1,300 @@
+import argparse
+import copy
+import functools
+import itertools
+import os
+import random
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from sched_lib.file_handling_helper import read_dag
+from sched_lib.dag_cache import DAGLibrary, get_dag_file_paths
+from sched_lib.algorithms.q_table_store import QTableStore
+from sched_lib.algorithms.dag_utils import convert_to_specified_ccr_dag, get_specified_ccr_dags
+from eval_cluster import evaluate, create_processor
+
+
+SWEEP_PARAMS = ['num_of_clusters', 'num_of_cores', 'inout_ratio', 'ccr']
+
+
+def option_parser():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--dag_dir',
+                            required=True,
+                            type=str,
+                            nargs='+',
+                            help='path to dag directories or packed DAG libraries (.dagb). \
+                                  Every DAG in them is evaluated.')
+    arg_parser.add_argument('-a', '--algorithm',
+                            required=True,
+                            type=str,
+                            nargs='+',
+                            choices=['HEFT', 'QL-HEFT', 'CQGA-HEFT', 'HTSTC'],
+                            help='Algorithm names used for evaluation.')
+    arg_parser.add_argument('--num_of_clusters',
+                            required=True,
+                            type=int,
+                            nargs='+',
+                            help='Numbers of clusters in a clustered many-core processor.')
+    arg_parser.add_argument('--num_of_cores',
+                            required=True,
+                            type=int,
+                            nargs='+',
+                            help='Numbers of cores in a single cluster.')
+    arg_parser.add_argument('--inout_ratio',
+                            required=True,
+                            type=float,
+                            nargs='+',
+                            help='Ratios of communication time outside the cluster to \
+                                  communication time inside the cluster.')
+    arg_parser.add_argument('--ccr',
+                            required=False,
+                            type=float,
+                            nargs='+',
+                            default=[None],
+                            help='CCR values of DAG. If omitted, the DAGs are used as they are.')
+    arg_parser.add_argument('--ccr_method',
+                            required=False,
+                            type=str,
+                            default='iterative',
+                            choices=['iterative', 'closed_form'],
+                            help='Method of the CCR conversion. \
+                                  "closed_form" computes all CCR variants of a DAG in one vectorized call.')
+    arg_parser.add_argument('--xaxis',
+                            required=True,
+                            type=str,
+                            choices=['num_of_tasks'] + SWEEP_PARAMS,
+                            help='Parameter used as the directory level read by box_plot.py. \
+                                  "num_of_tasks" uses the name of each dag directory.')
+    arg_parser.add_argument('--processor_model',
+                            required=False,
+                            type=str,
+                            default='object',
+                            choices=['object', 'array'],
+                            help='Processor representation used by the list scheduler.')
+    arg_parser.add_argument('--scheduling_policy',
+                            required=False,
+                            type=str,
+                            default='append',
+                            choices=['append', 'insertion'],
+                            help='Placement of tasks on cores by the list scheduler (except HTSTC).')
+    arg_parser.add_argument('--learning_engine',
+                            required=False,
+                            type=str,
+                            default='serial',
+                            choices=['serial', 'batch'],
+                            help='Q-learning engine used by QL-HEFT.')
+    arg_parser.add_argument('--q_table_backend',
+                            required=False,
+                            type=str,
+                            default='dense',
+                            choices=['dense', 'sparse'],
+                            help='Q-table representation of QL-HEFT and CQGA-HEFT. \
+                                  "sparse" stores only the transitions that can occur in a topological order.')
+    arg_parser.add_argument('--population_backend',
+                            required=False,
+                            type=str,
+                            default='object',
+                            choices=['object', 'array'],
+                            help='Population representation of CQGA-HEFT.')
+    arg_parser.add_argument('--q_table_mode',
+                            required=False,
+                            type=str,
+                            default='retrain',
+                            choices=['retrain', 'transfer'],
+                            help='Q-learning of each CQGA-HEFT chromosome. \
+                                  "transfer" fine-tunes the Q-table of the nearest evaluated chromosome.')
+    arg_parser.add_argument('--fine_tuning_ratio',
+                            required=False,
+                            type=float,
+                            default=0.2,
+                            help='Ratio of the number of episodes used to fine-tune a transferred Q-table.')
+    arg_parser.add_argument('--q_table_store',
+                            required=False,
+                            type=str,
+                            help='path to Q-table store directory of QL-HEFT. \
+                                  Sweep points of the same DAG start from the closest stored Q-table.')
+    arg_parser.add_argument('--warm_start_ratio',
+                            required=False,
+                            type=float,
+                            default=0.2,
+                            help='Ratio of the number of episodes used when learning starts from a stored Q-table.')
+    arg_parser.add_argument('--convergence_check',
+                            required=False,
+                            type=str,
+                            choices=['sched_list', 'q_delta'],
+                            help='Stop the learning of QL-HEFT once the greedy sched_list ("sched_list") or \
+                                  the Q-table ("q_delta") has been stable for --convergence_window checks.')
+    arg_parser.add_argument('--check_interval',
+                            required=False,
+                            type=int,
+                            default=500,
+                            help='Number of episodes between convergence checks.')
+    arg_parser.add_argument('--convergence_window',
+                            required=False,
+                            type=int,
+                            default=3,
+                            help='Number of consecutive stable checks required to stop the learning.')
+    arg_parser.add_argument('--num_of_workers',
+                            required=False,
+                            type=int,
+                            default=os.cpu_count(),
+                            help='Number of worker processes.')
+    arg_parser.add_argument('--seed',
+                            required=False,
+                            type=int,
+                            help='Random seed of the evaluation. Every task is seeded from it, \
+                                  so the results do not depend on which worker runs which task.')
+    arg_parser.add_argument('--write_makespan',
+                            required=False,
+                            action='store_true',
+                            help='Write out the makespan in the log.')
+    arg_parser.add_argument('--write_duration',
+                            required=False,
+                            action='store_true',
+                            help='Write out the duration in the log.')
+    arg_parser.add_argument('-d', '--dest_dir',
+                            required=True,
+                            type=str,
+                            help='path to result dir.')
+    args = arg_parser.parse_args()
+
+    return args
+
+
+def get_dest_file_path(dest_dir: str, dag_dir: str, point: dict, xaxis: str, alg: str) -> str:
+    # dest_dir/<other parameters>/<xaxis value>/<algorithm>.csv (the layout read by box_plot.py)
+    dag_set_name = os.path.basename(os.path.normpath(dag_dir))
+    if(dag_set_name.endswith('.dagb')):
+        dag_set_name = dag_set_name[:-len('.dagb')]
+    if(xaxis == 'num_of_tasks'):
+        xaxis_value = dag_set_name
+    else:
+        xaxis_value = str(point[xaxis])
+    group = [f'{k}_{v}' for k, v in point.items() if k != xaxis and v is not None]
+    if(xaxis != 'num_of_tasks'):
+        group.insert(0, dag_set_name)
+
+    return os.path.join(dest_dir, '_'.join(group), xaxis_value, f'{alg}.csv')
+
+
+def get_dag_sources(dag_dir: str) -> List[Tuple[str, Optional[int], str]]:
+    # (path, index in the packed library or None, DAG name)
+    if(os.path.isfile(dag_dir) and dag_dir.endswith('.dagb')):
+        return [(dag_dir, i, name) for i, name in enumerate(DAGLibrary(dag_dir).names)]
+    return [(p, None, os.path.basename(p)) for p in get_dag_file_paths(dag_dir)]
+
+
+@functools.lru_cache(maxsize=None)
+def _open_library(library_path: str) -> DAGLibrary:
+    # Each worker maps the library once
+    return DAGLibrary(library_path)
+
+
+@functools.lru_cache(maxsize=64)
+def _read_dag_cached(dag_path: str, library_idx: Optional[int]):
+    if(library_idx is None):
+        return read_dag(dag_path)
+    return _open_library(dag_path).get_dag(library_idx)
+
+
+@functools.lru_cache(maxsize=64)
+def _get_ccr_dag_cached(dag_path: str, library_idx: Optional[int], ccr: Optional[float], ccrs: Tuple[float], ccr_method: str):
+    if(not ccr):
+        return _read_dag_cached(dag_path, library_idx)
+    if(ccr_method == 'closed_form'):
+        # Every CCR variant of the DAG is created at once and kept for the following tasks
+        dags = _get_ccr_family_cached(dag_path, library_idx, ccrs)
+        return dags[ccrs.index(ccr)]
+    G = copy.deepcopy(_read_dag_cached(dag_path, library_idx))
+    convert_to_specified_ccr_dag(G, ccr)
+
+    return G
+
+
+@functools.lru_cache(maxsize=4)
+def _get_ccr_family_cached(dag_path: str, library_idx: Optional[int], ccrs: Tuple[float]):
+    dags, _ = get_specified_ccr_dags(_read_dag_cached(dag_path, library_idx), list(ccrs))
+    return dags
+
+
+@functools.lru_cache(maxsize=None)
+def _open_q_table_store(store_dir: str) -> QTableStore:
+    return QTableStore(store_dir)
+
+
+def _evaluate_task(task: Tuple) -> Tuple[float, int]:
+    # Runs inside the long-lived worker processes
+    (dag_path, library_idx), alg, point, processor_model, ccr_method, ccrs, options, task_seed = task
+    # Workers are forked with the same random states, so every task starts from its own seed
+    random.seed(task_seed)
+    np.random.seed(task_seed)
+    G = copy.deepcopy(_get_ccr_dag_cached(dag_path, library_idx, point['ccr'], ccrs, ccr_method))
+    P = create_processor(processor_model, point['num_of_clusters'], point['num_of_cores'], point['inout_ratio'])
+
+    options = dict(options)
+    if(options['q_table_store']):
+        options['q_table_store'] = _open_q_table_store(options['q_table_store'])
+
+    return evaluate(G, alg, P, **options)
+
+
+def main(args) -> None:
+    points = [dict(zip(SWEEP_PARAMS, values))
+              for values in itertools.product(args.num_of_clusters, args.num_of_cores, args.inout_ratio, args.ccr)]
+
+    # Tasks of the same DAG are consecutive, so a chunk shares the parsed DAG in a worker
+    ccrs = tuple(ccr for ccr in args.ccr if ccr)
+    # Keyword arguments of evaluate()
+    options = {'learning_engine': args.learning_engine,
+               'q_table_store': args.q_table_store,
+               'warm_start_ratio': args.warm_start_ratio,
+               'convergence_check': args.convergence_check,
+               'check_interval': args.check_interval,
+               'convergence_window': args.convergence_window,
+               'q_table_backend': args.q_table_backend,
+               'population_backend': args.population_backend,
+               'q_table_mode': args.q_table_mode,
+               'fine_tuning_ratio': args.fine_tuning_ratio,
+               'scheduling_policy': args.scheduling_policy}
+    # Independent seed streams of the tasks (from OS entropy if no seed is given)
+    seed_seq = np.random.SeedSequence(args.seed)
+    tasks = []
+    dests = []
+    names = []
+    for dag_dir in args.dag_dir:
+        for dag_path, library_idx, name in get_dag_sources(dag_dir):
+            for point, alg in itertools.product(points, args.algorithm):
+                task_seed = int(seed_seq.spawn(1)[0].generate_state(1)[0])
+                tasks.append(((dag_path, library_idx), alg, point, args.processor_model, args.ccr_method, ccrs, options, task_seed))
+                dests.append(get_dest_file_path(args.dest_dir, dag_dir, point, args.xaxis, alg))
+                names.append(name)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=args.num_of_workers) as executor:
+        chunksize = len(points) * len(args.algorithm)
+        for name, dest, (duration, makespan) in zip(names, dests, executor.map(_evaluate_task, tasks, chunksize=chunksize)):
+            log_str = name
+            if(args.write_duration):
+                log_str += f',{duration}'
+            if(args.write_makespan):
+                log_str += f',{makespan}'
+            results.setdefault(dest, []).append(log_str)
+
+    # Write results (tasks were created in DAG-index order)
+    columns = 'Filename'
+    if(args.write_duration):
+        columns += ',Duration'
+    if(args.write_makespan):
+        columns += ',Makespan'
+    for dest, log_str_list in results.items():
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with open(dest, 'w') as f:
+            f.write(columns + '\n')
+            for log_str in log_str_list:
+                f.write(log_str + '\n')
+
+
+if __name__ == '__main__':
+    main(option_parser())
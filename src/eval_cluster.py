@@ -1,5 +1,6 @@
 import argparse
 import os
+import random
 import time
 import numpy as np
 import networkx as nx
@@ -7,14 +8,16 @@ from typing import Tuple
 
 from sched_lib.file_handling_helper import read_dag
 from sched_lib.processors.homogeneous.cluster import CluesteredProcessor
+from sched_lib.processors.homogeneous.array_cluster import ArrayClusteredProcessor
 from sched_lib.algorithms.static.HEFT import HEFT_cluster
 from sched_lib.algorithms.static.QLHEFT import QLHEFTToClusteredProcessor
 from sched_lib.algorithms.static.CQGAHEFT import CQGAHEFT
 from sched_lib.algorithms.static.HTSTC import HTSTC
 from sched_lib.algorithms.static.HTSTC import HTSTCListSchedulerToClusteredProcessor
-from sched_lib.scheduler.list_scheduler import ListSchedulerToClusteredProcessor
+from sched_lib.scheduler.list_scheduler import ListSchedulerToClusteredProcessor, InsertionListSchedulerToClusteredProcessor
 from sched_lib.algorithms.dag_utils import convert_to_specified_ccr_dag
 from sched_lib.algorithms.static.num_learn import num_learn
+from sched_lib.algorithms.q_table_store import QTableStore
 
 
 def option_parser():
@@ -41,10 +44,137 @@ def option_parser():
                             type=float,
                             help='Ratio of communication time outside the cluster to \
                                   communication time inside the cluster for clustered many-core processor.')
+    arg_parser.add_argument('--processor_model',
+                            required=False,
+                            type=str,
+                            default='object',
+                            choices=['object', 'array'],
+                            help='Processor representation used by the list scheduler. \
+                                  "array" keeps per-core availability times in arrays and min-heaps.')
+    arg_parser.add_argument('--scheduling_policy',
+                            required=False,
+                            type=str,
+                            default='append',
+                            choices=['append', 'insertion'],
+                            help='Placement of tasks on cores by the list scheduler (except HTSTC). \
+                                  "insertion" may place a task in an idle gap between two tasks on a core.')
+    arg_parser.add_argument('--learning_engine',
+                            required=False,
+                            type=str,
+                            default='serial',
+                            choices=['serial', 'batch'],
+                            help='Q-learning engine used by QL-HEFT. \
+                                  "batch" runs many episodes at once as NumPy batch operations.')
+    arg_parser.add_argument('--q_table_backend',
+                            required=False,
+                            type=str,
+                            default='dense',
+                            choices=['dense', 'sparse'],
+                            help='Q-table representation of QL-HEFT and CQGA-HEFT. \
+                                  "sparse" stores only the transitions that can occur in a topological order.')
+    arg_parser.add_argument('--num_of_workers',
+                            required=False,
+                            type=int,
+                            default=1,
+                            help='Number of worker processes used for the fitness evaluation of CQGA-HEFT \
+                                  and for the learning of QL-HEFT.')
+    arg_parser.add_argument('--sync_interval',
+                            required=False,
+                            type=int,
+                            default=100,
+                            help='Number of episodes each QL-HEFT worker learns between two merges of the Q-tables.')
+    arg_parser.add_argument('--num_of_islands',
+                            required=False,
+                            type=int,
+                            default=1,
+                            help='Number of sub-populations of CQGA-HEFT evolved in parallel (island model).')
+    arg_parser.add_argument('--migration_interval',
+                            required=False,
+                            type=int,
+                            default=5,
+                            help='Number of generations between two migrations of the island model.')
+    arg_parser.add_argument('--num_of_migrants',
+                            required=False,
+                            type=int,
+                            default=1,
+                            help='Number of elites each island sends at a migration.')
+    arg_parser.add_argument('--migration_topology',
+                            required=False,
+                            type=str,
+                            default='ring',
+                            choices=['ring', 'fully_connected'],
+                            help='Islands that receive the elites of an island.')
+    arg_parser.add_argument('--population_backend',
+                            required=False,
+                            type=str,
+                            default='object',
+                            choices=['object', 'array'],
+                            help='Population representation of CQGA-HEFT. \
+                                  "array" keeps the population in a NumPy array and evolves it with array operations.')
+    arg_parser.add_argument('--q_table_mode',
+                            required=False,
+                            type=str,
+                            default='retrain',
+                            choices=['retrain', 'transfer'],
+                            help='Q-learning of each CQGA-HEFT chromosome. "retrain" learns every chromosome from scratch, \
+                                  "transfer" fine-tunes the Q-table of the nearest evaluated chromosome.')
+    arg_parser.add_argument('--fine_tuning_ratio',
+                            required=False,
+                            type=float,
+                            default=0.2,
+                            help='Ratio of the number of episodes used to fine-tune a transferred Q-table.')
+    arg_parser.add_argument('--seed',
+                            required=False,
+                            type=int,
+                            help='Random seed of the evaluation (also used for the fitness evaluation of CQGA-HEFT and \
+                                  the QL-HEFT workers). With a seed, the results of CQGA-HEFT do not depend on --num_of_workers.')
+    arg_parser.add_argument('--q_table_store',
+                            required=False,
+                            type=str,
+                            help='path to Q-table store directory of QL-HEFT. \
+                                  Learned Q-tables are saved there, and learning starts from the closest stored table.')
+    arg_parser.add_argument('--warm_start_ratio',
+                            required=False,
+                            type=float,
+                            default=0.2,
+                            help='Ratio of the number of episodes used when learning starts from a stored Q-table.')
+    arg_parser.add_argument('--convergence_check',
+                            required=False,
+                            type=str,
+                            choices=['sched_list', 'q_delta'],
+                            help='Stop the learning of QL-HEFT once the greedy sched_list ("sched_list") or \
+                                  the Q-table ("q_delta") has been stable for --convergence_window checks.')
+    arg_parser.add_argument('--check_interval',
+                            required=False,
+                            type=int,
+                            default=500,
+                            help='Number of episodes between convergence checks.')
+    arg_parser.add_argument('--convergence_window',
+                            required=False,
+                            type=int,
+                            default=3,
+                            help='Number of consecutive stable checks required to stop the learning.')
+    arg_parser.add_argument('--checkpoint_path',
+                            required=False,
+                            type=str,
+                            help='path to checkpoint file of QL-HEFT or CQGA-HEFT. \
+                                  The run is checkpointed there periodically and resumed from it if it exists.')
+    arg_parser.add_argument('--checkpoint_interval',
+                            required=False,
+                            type=int,
+                            help='Number of episodes (QL-HEFT, default 1000) or generations (CQGA-HEFT, default 1) \
+                                  between two checkpoints.')
     arg_parser.add_argument('--ccr',
                             required=False,
                             type=float,
                             help='CCR value of DAG.')
+    arg_parser.add_argument('--ccr_method',
+                            required=False,
+                            type=str,
+                            default='iterative',
+                            choices=['iterative', 'closed_form'],
+                            help='Method of the CCR conversion. \
+                                  "closed_form" computes the scale factors directly instead of scaling by 2%% per pass.')
     arg_parser.add_argument('--write_makespan',
                             required=False,
                             action='store_true',
@@ -59,39 +189,43 @@ def option_parser():
                             help='path to result file.')
     args = arg_parser.parse_args()
 
-    return args.dag_file_path, args.algorithm, args.num_of_clusters, args.num_of_cores, args.inout_ratio, args.ccr, args.dest_file_path, args.write_makespan, args.write_duration
+    return args
 
 
-def main(dag_file_path, alg, num_clusters, num_cores, inout_ratio, ccr, dest_file_path, write_makespan, write_duration):
-    G = read_dag(dag_file_path)
-    if(ccr):
-        convert_to_specified_ccr_dag(G, ccr)
-    P = CluesteredProcessor(num_clusters, num_cores, inout_ratio)
-    log_str = os.path.basename(dag_file_path)
-
+def evaluate(G: nx.DiGraph, alg: str, P, learning_engine='serial', num_of_workers=1, seed=None, q_table_store=None, warm_start_ratio=0.2,
+             convergence_check=None, check_interval=500, convergence_window=3, q_table_backend='dense',
+             sync_interval=100, num_of_islands=1, migration_interval=5, num_of_migrants=1, migration_topology='ring',
+             population_backend='object', q_table_mode='retrain', fine_tuning_ratio=0.2, scheduling_policy='append',
+             checkpoint_path=None, checkpoint_interval=None) -> Tuple[float, int]:
     if(alg == 'HEFT'):
         start_time = time.time()
         sched_list = HEFT_cluster(G, P.inout_ratio)
         duration = time.time() - start_time
-        if(write_duration):
-            log_str += f',{duration}'
-        S = ListSchedulerToClusteredProcessor(G, P, sched_list)
+        S = create_list_scheduler(scheduling_policy, G, P, sched_list)
         S.schedule()
     elif(alg == 'QL-HEFT'):
-        qlheft = QLHEFTToClusteredProcessor(G, 1.0, 0.2, P.inout_ratio)
+        qlheft = QLHEFTToClusteredProcessor(G, 1.0, 0.2, P.inout_ratio, learning_engine,
+                                            q_table_store=q_table_store, warm_start_ratio=warm_start_ratio,
+                                            convergence_check=convergence_check, check_interval=check_interval,
+                                            convergence_window=convergence_window, q_table_backend=q_table_backend,
+                                            num_of_workers=num_of_workers, sync_interval=sync_interval, seed=seed,
+                                            checkpoint_path=checkpoint_path, checkpoint_interval=checkpoint_interval or 1000)
         qlheft.learn(num_learn[str(G.number_of_nodes())])
-        if(write_duration):
-            log_str += f',{qlheft.learning_log["duration"]}'
+        duration = qlheft.learning_log['duration']
         sched_list = qlheft.get_sched_list()
-        S = ListSchedulerToClusteredProcessor(G, P, sched_list)
+        S = create_list_scheduler(scheduling_policy, G, P, sched_list)
         S.schedule()
     elif(alg == 'CQGA-HEFT'):
-        cqgaheft = CQGAHEFT(G, 8, 30, 0.01, 1.0, 0.2, P)
+        cqgaheft = CQGAHEFT(G, 8, 30, 0.01, 1.0, 0.2, P, num_of_workers, seed, q_table_backend=q_table_backend,
+                            num_of_islands=num_of_islands, migration_interval=migration_interval,
+                            num_of_migrants=num_of_migrants, migration_topology=migration_topology,
+                            population_backend=population_backend, q_table_mode=q_table_mode,
+                            fine_tuning_ratio=fine_tuning_ratio, checkpoint_path=checkpoint_path,
+                            checkpoint_interval=checkpoint_interval or 1)
         cqgaheft.evolution()
-        if(write_duration):
-            log_str += f',{cqgaheft.duration}'
+        duration = cqgaheft.duration
         sched_list = cqgaheft.get_sched_list()
-        S = ListSchedulerToClusteredProcessor(G, P, sched_list)
+        S = create_list_scheduler(scheduling_policy, G, P, sched_list)
         S.schedule()
     elif(alg == 'HTSTC'):
         start_time = time.time()
@@ -101,18 +235,65 @@ def main(dag_file_path, alg, num_clusters, num_cores, inout_ratio, ccr, dest_fil
             HTSTC.merge_two_nodes(G, node_i, succ_i)
         S = HTSTCListSchedulerToClusteredProcessor(G, P, sched_list)
         duration = time.time() - start_time
-        if(write_duration):
-            log_str += f',{duration}'
         S.schedule_using_task_duplication()
 
+    return duration, S.get_makespan()
+
+
+def create_processor(processor_model, num_clusters, num_cores, inout_ratio):
+    if(processor_model == 'array'):
+        return ArrayClusteredProcessor(num_clusters, num_cores, inout_ratio)
+    return CluesteredProcessor(num_clusters, num_cores, inout_ratio)
+
+
+def create_list_scheduler(scheduling_policy, G, P, sched_list):
+    if(scheduling_policy == 'insertion'):
+        return InsertionListSchedulerToClusteredProcessor(G, P, sched_list)
+    return ListSchedulerToClusteredProcessor(G, P, sched_list)
+
+
+def main(args) -> None:
+    if(args.seed is not None):
+        random.seed(args.seed)
+        np.random.seed(args.seed)
+    G = read_dag(args.dag_file_path)
+    if(args.ccr):
+        convert_to_specified_ccr_dag(G, args.ccr, args.ccr_method)
+    P = create_processor(args.processor_model, args.num_of_clusters, args.num_of_cores, args.inout_ratio)
+    log_str = os.path.basename(args.dag_file_path)
+
+    # Keyword arguments of evaluate()
+    options = {'learning_engine': args.learning_engine,
+               'num_of_workers': args.num_of_workers,
+               'seed': args.seed,
+               'q_table_store': QTableStore(args.q_table_store) if args.q_table_store else None,
+               'warm_start_ratio': args.warm_start_ratio,
+               'convergence_check': args.convergence_check,
+               'check_interval': args.check_interval,
+               'convergence_window': args.convergence_window,
+               'q_table_backend': args.q_table_backend,
+               'sync_interval': args.sync_interval,
+               'num_of_islands': args.num_of_islands,
+               'migration_interval': args.migration_interval,
+               'num_of_migrants': args.num_of_migrants,
+               'migration_topology': args.migration_topology,
+               'population_backend': args.population_backend,
+               'q_table_mode': args.q_table_mode,
+               'fine_tuning_ratio': args.fine_tuning_ratio,
+               'scheduling_policy': args.scheduling_policy,
+               'checkpoint_path': args.checkpoint_path,
+               'checkpoint_interval': args.checkpoint_interval}
+    duration, makespan = evaluate(G, args.algorithm, P, **options)
+
     # Write result
-    if(write_makespan):
-        log_str += f',{S.get_makespan()}'
-    f = open(dest_file_path, "a")
+    if(args.write_duration):
+        log_str += f',{duration}'
+    if(args.write_makespan):
+        log_str += f',{makespan}'
+    f = open(args.dest_file_path, "a")
     f.write(log_str + "\n")
     f.close()
 
 
 if __name__ == '__main__':
-    dag_file_path, alg, num_clusters, num_cores, inout_ratio, ccr, dest_file_path, write_makespan, write_duration = option_parser()
-    main(dag_file_path, alg, num_clusters, num_cores, inout_ratio, ccr, dest_file_path, write_makespan, write_duration)
+    main(option_parser())
@@ -0,0 +1,49 @@
+import argparse
+import os
+from typing import List, Tuple
+
+from sched_lib.dag_cache import load_dag_library
+
+
+def option_parser() -> Tuple[List[str], str, bool]:
+    usage = f'[python] {__file__} \
+              --dag_dir [path to dag directories] \
+              --dest_dir [path to output directory] \
+              (--force)'
+
+    arg_parser = argparse.ArgumentParser(usage=usage)
+    arg_parser.add_argument('--dag_dir',
+                            required=True,
+                            type=str,
+                            nargs='+',
+                            help='path to dag directories. Each directory is packed into <dest_dir>/<name>.dagb.')
+    arg_parser.add_argument('--dest_dir',
+                            required=False,
+                            type=str,
+                            help='path to output directory. If omitted, the file is placed next to each dag directory.')
+    arg_parser.add_argument('--force',
+                            required=False,
+                            action='store_true',
+                            help='Rebuild even if the existing file matches the source files.')
+    args = arg_parser.parse_args()
+
+    return args.dag_dir, args.dest_dir, args.force
+
+
+def main(dag_dirs, dest_dir, force):
+    for dag_dir in dag_dirs:
+        name = os.path.basename(os.path.normpath(dag_dir))
+        if(dest_dir):
+            os.makedirs(dest_dir, exist_ok=True)
+            cache_path = os.path.join(dest_dir, f'{name}.dagb')
+        else:
+            cache_path = f'{os.path.normpath(dag_dir)}.dagb'
+        if(force and os.path.exists(cache_path)):
+            os.remove(cache_path)
+        library = load_dag_library(dag_dir, cache_path)
+        print(f'{cache_path}: {len(library)} DAGs')
+
+
+if __name__ == '__main__':
+    dag_dirs, dest_dir, force = option_parser()
+    main(dag_dirs, dest_dir, force)
@@ -1,26 +1,31 @@
 import networkx as nx
 import numpy as np
+from typing import List, Tuple, Union
 
+from sched_lib.compiled_dag import CompiledDAG
+from sched_lib.exceptions import AlgorithmError, UnimplementedError
+from sched_lib.algorithms.rank_engine import RankEngine
 
-def set_ranku(G: nx.DiGraph) -> None:
-    def _ranku(node_i):
-        if(node_i in exit_nodes):
-            G.nodes[node_i]['ranku'] = G.nodes[node_i]['exec']
-        else:
-            for uncalc_succ_i in [sn for sn in G.succ[node_i] if 'ranku' not in G.nodes[sn].keys()]:
-                _ranku(uncalc_succ_i)
 
-            max_value = 0
-            for succ_i in G.succ[node_i]:
-                tmp = G.edges[node_i, succ_i]['comm'] + G.nodes[succ_i]['ranku']
-                if(tmp > max_value):
-                    max_value = tmp
-            G.nodes[node_i]['ranku'] = G.nodes[node_i]['exec'] + max_value
+def calc_ranku(dag: CompiledDAG, comm_costs: np.ndarray = None) -> np.ndarray:
+    # comm_costs of shape (B, E) gives ranku of shape (B, N)
+    return RankEngine(dag).calc_ranku(comm_costs=comm_costs)
+
+
+def calc_rankd(dag: CompiledDAG, comm_costs: np.ndarray = None) -> np.ndarray:
+    return RankEngine(dag).calc_rankd(comm_costs=comm_costs)
+
+
+def get_critical_path_length(dag: CompiledDAG, comm_costs: np.ndarray = None) -> Union[int, np.ndarray]:
+    cp_len = RankEngine(dag).calc_critical_path_length(comm_costs=comm_costs)
+    return cp_len.item() if cp_len.ndim == 0 else cp_len
 
-    entry_nodes = [v for v, d in G.in_degree() if d == 0]
-    exit_nodes = [v for v, d in G.out_degree() if d == 0]
-    for entry_node in entry_nodes:
-        _ranku(entry_node)
+
+def set_ranku(G: nx.DiGraph, dag: CompiledDAG = None) -> None:
+    if(dag is None):
+        dag = CompiledDAG(G)
+    for node_i, ranku in zip(dag.node_labels, calc_ranku(dag).tolist()):
+        G.nodes[node_i]['ranku'] = ranku
 
 
 def convert_to_ave_comm_dag(G: nx.DiGraph, inout_ratio: float) -> None:
@@ -28,9 +33,18 @@ def convert_to_ave_comm_dag(G: nx.DiGraph, inout_ratio: float) -> None:
         G.edges[s, t]['comm'] = int((G.edges[s, t]['comm'] + G.edges[s, t]['comm']*inout_ratio) / 2)
 
 
+def _get_free_label(G: nx.DiGraph) -> int:
+    # G.number_of_nodes() unless it is already used (e.g. nodes labelled from 1)
+    node_i = G.number_of_nodes()
+    while(node_i in G):
+        node_i += 1
+
+    return node_i
+
+
 def convert_to_virtual_entry_dag(G: nx.DiGraph) -> int:
     entry_nodes = [v for v, d in G.in_degree() if d == 0]
-    virtual_entry_i = G.number_of_nodes()
+    virtual_entry_i = _get_free_label(G)
     G.add_node(virtual_entry_i, exec=0, virtual=True)
     for entry_i in entry_nodes:
         G.add_edge(virtual_entry_i, entry_i, comm=0)
@@ -40,7 +54,7 @@ def convert_to_virtual_entry_dag(G: nx.DiGraph) -> int:
 
 def convert_to_virtual_exit_dag(G: nx.DiGraph) -> int:
     exit_nodes = [v for v, d in G.out_degree() if d == 0]
-    virtual_exit_i = G.number_of_nodes()
+    virtual_exit_i = _get_free_label(G)
     G.add_node(virtual_exit_i, exec=0, virtual=True)
     for exit_i in exit_nodes:
         G.add_edge(exit_i, virtual_exit_i, comm=0)
@@ -48,21 +62,84 @@ def convert_to_virtual_exit_dag(G: nx.DiGraph) -> int:
     return virtual_exit_i
 
 
-def get_ccr(dag: nx.DiGraph) -> float:
+def get_ccr(dag: Union[nx.DiGraph, CompiledDAG]) -> float:
+    if(isinstance(dag, CompiledDAG)):
+        return dag.comm.mean() / dag.exec.mean()
+
     sum_comm = 0
-    for s, t in dag.edges:
-        sum_comm += dag.edges[s, t]['comm']
+    for _, _, comm in dag.edges(data='comm'):
+        sum_comm += comm
     ave_comm = sum_comm / dag.number_of_edges()
-    
+
     sum_exec = 0
-    for node_i in dag.nodes:
-        sum_exec += dag.nodes[node_i]['exec']
+    for _, exec_time in dag.nodes(data='exec'):
+        sum_exec += exec_time
     ave_exec = sum_exec / dag.number_of_nodes()
-    
+
     return ave_comm / ave_exec
 
 
-def convert_to_specified_ccr_dag(G: nx.DiGraph, CCR: float) -> None:
+def get_specified_ccr_costs(
+    dag: CompiledDAG,
+    CCRs: List[float],
+    num_of_refinements: int = 3
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Scales comm by s and exec by 1/s with s = sqrt(target / current), so that the total
+    # work stays about the same. Each refinement corrects the error caused by np.ceil,
+    # and the closest result of all refinements is kept.
+    # Returns exec (K, N), comm (K, E) and the achieved CCRs (K,).
+    if(dag.num_of_edges == 0 or not dag.comm.any()):
+        raise AlgorithmError('CCR of a DAG without communication cannot be changed.')
+    exec_costs = dag.exec.astype(np.float64)
+    comm_costs = dag.comm.astype(np.float64)
+    targets = np.asarray(CCRs, dtype=np.float64)
+    scales = np.sqrt(targets / get_ccr(dag))
+    best_exec = best_comm = best_achieved = None
+    for _ in range(num_of_refinements + 1):
+        exec_family = np.ceil(exec_costs[None, :] / scales[:, None]).astype(np.int64)
+        comm_family = np.ceil(comm_costs[None, :] * scales[:, None]).astype(np.int64)
+        achieved = comm_family.mean(axis=1) / exec_family.mean(axis=1)
+        if(best_achieved is None):
+            best_exec, best_comm, best_achieved = exec_family, comm_family, achieved
+        else:
+            better = np.abs(achieved - targets) < np.abs(best_achieved - targets)
+            best_exec = np.where(better[:, None], exec_family, best_exec)
+            best_comm = np.where(better[:, None], comm_family, best_comm)
+            best_achieved = np.where(better, achieved, best_achieved)
+        scales *= np.sqrt(targets / achieved)
+
+    return best_exec, best_comm, best_achieved
+
+
+def _set_costs(G: nx.DiGraph, dag: CompiledDAG, exec_costs: np.ndarray, comm_costs: np.ndarray) -> None:
+    for node_i, exec_time in zip(dag.node_labels, exec_costs.tolist()):
+        G.nodes[node_i]['exec'] = exec_time
+    for s, t, comm in zip(dag.edge_src.tolist(), dag.edge_dst.tolist(), comm_costs.tolist()):
+        G.edges[dag.node_labels[s], dag.node_labels[t]]['comm'] = comm
+
+
+def get_specified_ccr_dags(G: nx.DiGraph, CCRs: List[float]) -> Tuple[List[nx.DiGraph], np.ndarray]:
+    # CCR variants of one DAG computed in one vectorized call
+    dag = CompiledDAG(G)
+    exec_family, comm_family, achieved = get_specified_ccr_costs(dag, CCRs)
+    dags = []
+    for exec_costs, comm_costs in zip(exec_family, comm_family):
+        H = G.copy()
+        _set_costs(H, dag, exec_costs, comm_costs)
+        dags.append(H)
+
+    return dags, achieved
+
+
+def convert_to_specified_ccr_dag(G: nx.DiGraph, CCR: float, method: str = 'iterative') -> float:
+    if(method == 'closed_form'):
+        dag = CompiledDAG(G)
+        exec_family, comm_family, achieved = get_specified_ccr_costs(dag, [CCR])
+        _set_costs(G, dag, exec_family[0], comm_family[0])
+        return achieved[0].item()
+    if(method != 'iterative'):
+        raise UnimplementedError(f'CCR conversion method "{method}" is not implemented.')
+
     while(abs(CCR - (cur_ccr := round(get_ccr(G), 3))) > 0.01):
         if(cur_ccr > CCR):
             for s, t in G.edges:
@@ -74,3 +151,5 @@ def convert_to_specified_ccr_dag(G: nx.DiGraph, CCR: float) -> None:
                 G.edges[s, t]['comm'] = int(np.ceil(G.edges[s, t]['comm'] * 1.02))
             for node_i in G.nodes:
                 G.nodes[node_i]['exec'] = int(np.ceil(G.nodes[node_i]['exec'] * 0.98))
+
+    return get_ccr(G)
@@ -1,16 +1,33 @@
 import random
 import time
-from typing import List, Tuple
+import numpy as np
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
 from abc import ABCMeta, abstractmethod
 
+from sched_lib.exceptions import UnimplementedError
+
 
 class Chromosome:
     def __init__(self, length: int, gene_options: List[int]):
         self.fitness = -1
         self.gene_list = [random.choice(gene_options) for _ in range(length)]
 
+    @classmethod
+    def from_gene_list(cls, gene_list: List[int], fitness=-1) -> 'Chromosome':
+        chromosome = cls.__new__(cls)
+        chromosome.fitness = fitness
+        chromosome.gene_list = gene_list
+
+        return chromosome
+
 
 class GeneticAlgorithm(metaclass=ABCMeta):
+    # population_backend='object' keeps a list of Chromosome objects.
+    # population_backend='array' keeps the whole population as a (num_of_population, chromosome_length)
+    # uint8 array (self.genes) and a fitness array (self.fitness), and performs selection,
+    # crossover and mutation as array operations. Its NumPy generator is seeded from `random`,
+    # so `random` stays the only random state of the GA in both backends.
     def __init__(
         self,
         chromosome_length: int,
@@ -18,14 +35,30 @@ class GeneticAlgorithm(metaclass=ABCMeta):
         num_of_population: int,
         max_population: int,
         mutation_ratio: float,
+        fitness_cache_size: int = 1024,
+        population_backend: str = 'object'
     ) -> None:
+        if(population_backend not in ['object', 'array']):
+            raise UnimplementedError(f'population backend "{population_backend}" is not implemented.')
         self.chromosome_length = chromosome_length
         self.gene_options = gene_options
         self.max_population = max_population
         self.mutation_ratio = mutation_ratio
-        self.population = [Chromosome(self.chromosome_length, gene_options) for _ in range(num_of_population)]
+        self.population_backend = population_backend
+        self._gene_options_array = np.asarray(gene_options, dtype=np.uint8)
+        self.population = []
+        self.genes = None
+        self.fitness = None
+        self._new_population(num_of_population)
         self.duration = None
 
+        # LRU cache of fitness values keyed by the packed gene list
+        self.fitness_cache_size = fitness_cache_size
+        self.fitness_cache_hits = 0
+        self.fitness_cache_misses = 0
+        self._fitness_cache = OrderedDict()
+        self._binary_genes = set(gene_options) <= {0, 1}
+
     @abstractmethod
     def _calc_fitness(self):
         pass
@@ -34,22 +67,151 @@ class GeneticAlgorithm(metaclass=ABCMeta):
     def evolution(self):
         pass
 
+    def _get_rng(self) -> np.random.Generator:
+        return np.random.default_rng(random.getrandbits(64))
+
+    def _new_population(self, num_of_population: int) -> None:
+        if(self.population_backend == 'array'):
+            rng = self._get_rng()
+            self.genes = self._gene_options_array[rng.integers(len(self.gene_options),
+                                                               size=(num_of_population, self.chromosome_length))]
+            self.fitness = np.full(num_of_population, -1, dtype=np.int64)
+        else:
+            self.population = [Chromosome(self.chromosome_length, self.gene_options) for _ in range(num_of_population)]
+
+    def get_num_of_population(self) -> int:
+        if(self.population_backend == 'array'):
+            return len(self.genes)
+        return len(self.population)
+
+    def _get_gene_lists(self) -> List[Sequence[int]]:
+        if(self.population_backend == 'array'):
+            return list(self.genes)
+        return [chromosome.gene_list for chromosome in self.population]
+
+    def _get_fitness_list(self) -> List:
+        if(self.population_backend == 'array'):
+            return self.fitness.tolist()
+        return [chromosome.fitness for chromosome in self.population]
+
+    def _set_fitness_list(self, fitness_list: List) -> None:
+        if(self.population_backend == 'array'):
+            self.fitness = np.asarray(fitness_list)
+        else:
+            for chromosome, fitness in zip(self.population, fitness_list):
+                chromosome.fitness = fitness
+
+    def _get_population_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        if(self.population_backend == 'array'):
+            return self.genes.copy(), self.fitness.copy()
+        return (np.asarray([chromosome.gene_list for chromosome in self.population], dtype=np.uint8).reshape(-1, self.chromosome_length),
+                np.asarray([chromosome.fitness for chromosome in self.population]))
+
+    def _set_population_arrays(self, genes: np.ndarray, fitness: np.ndarray) -> None:
+        if(self.population_backend == 'array'):
+            self.genes = np.asarray(genes, dtype=np.uint8)
+            self.fitness = np.asarray(fitness)
+        else:
+            self.population = [Chromosome.from_gene_list(gene_list, fitness)
+                               for gene_list, fitness in zip(np.asarray(genes).tolist(), np.asarray(fitness).tolist())]
+
+    def _get_best_gene_list(self) -> List[int]:
+        if(self.population_backend == 'array'):
+            return self.genes[np.argmin(self.fitness)].tolist()
+        return sorted(self.population, key=lambda x: x.fitness)[0].gene_list
+
+    def _get_gene_key(self, gene_list: Sequence[int]) -> bytes:
+        if(self._binary_genes):
+            return np.packbits(np.asarray(gene_list, dtype=np.uint8)).tobytes()
+        return np.asarray(gene_list, dtype=np.int64).tobytes()
+
+    def _get_gene_keys(self) -> List[bytes]:
+        if(self.population_backend == 'array' and self._binary_genes):
+            return [row.tobytes() for row in np.packbits(self.genes, axis=1)]
+        return [self._get_gene_key(gene_list) for gene_list in self._get_gene_lists()]
+
+    def _get_cached_fitness(self, gene_key: bytes) -> Optional[float]:
+        if(gene_key in self._fitness_cache):
+            self._fitness_cache.move_to_end(gene_key)
+            self.fitness_cache_hits += 1
+            return self._fitness_cache[gene_key]
+        self.fitness_cache_misses += 1
+
+        return None
+
+    def _set_cached_fitness(self, gene_key: bytes, fitness: float) -> None:
+        if(self.fitness_cache_size <= 0):
+            return
+        self._fitness_cache[gene_key] = fitness
+        self._fitness_cache.move_to_end(gene_key)
+        while(len(self._fitness_cache) > self.fitness_cache_size):
+            self._fitness_cache.popitem(last=False)
+
     def _elite_select(self, num_of_selections: int) -> List[int]:
         elite = sorted(self.population, key=lambda x: x.fitness)
         return elite[:num_of_selections]
 
     def _single_point_crossover(self, gene1: Chromosome, gene2: Chromosome) -> Tuple[Chromosome, Chromosome]:
-        gene1_after_cross = Chromosome(self.chromosome_length, self.gene_options)
-        gene2_after_cross = Chromosome(self.chromosome_length, self.gene_options)
-
         cross_point = random.randint(0, self.chromosome_length)
-        gene1_after_cross.gene_list = gene1.gene_list[cross_point:] + gene2.gene_list[:cross_point]
-        gene2_after_cross.gene_list = gene2.gene_list[cross_point:] + gene1.gene_list[:cross_point]
+        gene1_after_cross = Chromosome.from_gene_list(gene1.gene_list[cross_point:] + gene2.gene_list[:cross_point])
+        gene2_after_cross = Chromosome.from_gene_list(gene2.gene_list[cross_point:] + gene1.gene_list[:cross_point])
 
         return gene1_after_cross, gene2_after_cross
 
     def _mutate(self) -> None:
         for chromosome in self.population[1:]:
-            for gene in chromosome.gene_list:
+            for i in range(len(chromosome.gene_list)):
                 if(random.random() < self.mutation_ratio):
-                    gene = random.choice(self.gene_options)
+                    chromosome.gene_list[i] = random.choice(self.gene_options)
+
+    def _reproduce(self) -> None:
+        # Elites (a quarter of the population) survive, the rest is filled with their children,
+        # and every chromosome except the best one is mutated
+        num_of_population = self.get_num_of_population()
+        num_of_elites = int(np.ceil(num_of_population / 4))
+        num_of_pairs = int(np.ceil((num_of_population - num_of_elites) / 2))
+        if(self.population_backend == 'array'):
+            self._reproduce_array(num_of_elites, num_of_pairs)
+            return
+
+        offspring = self._elite_select(num_of_elites)
+
+        # crossover
+        children = []
+        for i in range(num_of_pairs):
+            gene1 = random.choice(offspring)
+            gene2 = random.choice(offspring)
+            child1, child2 = self._single_point_crossover(gene1, gene2)
+            children.append(child1)
+            children.append(child2)
+        offspring += children
+
+        self.population = offspring
+        self._mutate()
+
+    def _reproduce_array(self, num_of_elites: int, num_of_pairs: int) -> None:
+        rng = self._get_rng()
+        length = self.chromosome_length
+
+        # Elite selection (stable, as sorted() on the object backend)
+        elite_idx = np.argsort(self.fitness, kind='stable')[:num_of_elites]
+        elites = self.genes[elite_idx]
+        elite_fitness = self.fitness[elite_idx]
+
+        # Single-point crossover: child1 = parent1[cp:] + parent2[:cp], child2 = parent2[cp:] + parent1[:cp]
+        parents = elites[rng.integers(num_of_elites, size=(num_of_pairs, 2))]
+        cross_points = rng.integers(0, length + 1, size=num_of_pairs)
+        gather_idx = np.arange(length)[None, :] + cross_points[:, None]
+        child1 = np.take_along_axis(np.concatenate((parents[:, 0], parents[:, 1]), axis=1), gather_idx, axis=1)
+        child2 = np.take_along_axis(np.concatenate((parents[:, 1], parents[:, 0]), axis=1), gather_idx, axis=1)
+        children = np.stack((child1, child2), axis=1).reshape(-1, length)
+
+        self.genes = np.concatenate((elites, children))
+        self.fitness = np.concatenate((elite_fitness, np.full(len(children), -1, dtype=elite_fitness.dtype)))
+
+        # Mutation
+        mutation_mask = rng.random((len(self.genes) - 1, length)) < self.mutation_ratio
+        mutated = self.genes[1:]
+        mutated[mutation_mask] = self._gene_options_array[rng.integers(len(self.gene_options), size=int(mutation_mask.sum()))]
+        # Mutated chromosomes are evaluated again
+        self.fitness[1:][mutation_mask.any(axis=1)] = -1
@@ -0,0 +1,97 @@
+import numpy as np
+from numpy import random as rnd
+
+from sched_lib.compiled_dag import CompiledDAG
+
+
+class BatchQLearningEngine:
+    # Runs many independent QL-HEFT episodes at once. Each rollout keeps its
+    # ready nodes in a row of a (batch_size, N) array plus remaining in-degree
+    # counters, so one step of the whole batch costs O(batch_size * out-degree)
+    # array operations. Row maxima of the Q-table are cached and maintained
+    # incrementally instead of rescanning a dense row at every step.
+    def __init__(
+        self,
+        dag: CompiledDAG,
+        ranku: np.ndarray,
+        entry_i: int,
+        alpha: float,
+        gamma: float,
+        batch_size: int = 256
+    ) -> None:
+        self._dag = dag
+        self._ranku = np.asarray(ranku, dtype=np.float64)
+        self._entry_i = entry_i
+        self.alpha = alpha
+        self.gamma = gamma
+        self.batch_size = batch_size
+
+    def _get_succ_pairs(self, choose_nodes: np.ndarray):
+        # (rollout, successor) pairs of the chosen node of every rollout, grouped by rollout
+        counts = self._dag.out_degree[choose_nodes]
+        offsets = np.cumsum(counts) - counts
+        rollouts = np.repeat(np.arange(len(choose_nodes)), counts)
+        ranks = np.arange(len(rollouts)) - np.repeat(offsets, counts)
+        succs = self._dag.succ_idx[np.repeat(self._dag.succ_ptr[choose_nodes], counts) + ranks]
+
+        return rollouts, succs
+
+    def _release_succs(self, choose_nodes, remain_in_degree, ready_nodes, num_of_ready) -> None:
+        rollouts, succs = self._get_succ_pairs(choose_nodes)
+        remain_in_degree[rollouts, succs] -= 1
+        released = (remain_in_degree[rollouts, succs] == 0)
+        rollouts = rollouts[released]
+        succs = succs[released]
+
+        # Append released nodes to the end of each ready list
+        counts = np.bincount(rollouts, minlength=len(choose_nodes))
+        offsets = np.cumsum(counts) - counts
+        ranks = np.arange(len(rollouts)) - np.repeat(offsets, counts)
+        ready_nodes[rollouts, num_of_ready[rollouts] + ranks] = succs
+        num_of_ready += counts
+
+    def _run_batch(self, q_table: np.ndarray, row_max: np.ndarray, num_of_rollouts: int) -> None:
+        num_of_nodes = self._dag.num_of_nodes
+        rollouts = np.arange(num_of_rollouts)
+
+        # Initial setting
+        remain_in_degree = np.tile(self._dag.in_degree, (num_of_rollouts, 1))
+        ready_nodes = np.zeros((num_of_rollouts, num_of_nodes), dtype=np.int64)
+        num_of_ready = np.zeros(num_of_rollouts, dtype=np.int64)
+        current_states = np.full(num_of_rollouts, self._entry_i)
+        self._release_succs(current_states, remain_in_degree, ready_nodes, num_of_ready)
+
+        # Learning
+        for _k in range(num_of_nodes - 1):
+            # Choice node uniformly from each ready list (swap with the last one and pop)
+            choose_pos = (rnd.random(num_of_rollouts) * num_of_ready).astype(np.int64)
+            choose_nodes = ready_nodes[rollouts, choose_pos]
+            num_of_ready -= 1
+            ready_nodes[rollouts, choose_pos] = ready_nodes[rollouts, num_of_ready]
+            before_states = current_states
+            current_states = choose_nodes
+
+            # Update ready lists
+            self._release_succs(current_states, remain_in_degree, ready_nodes, num_of_ready)
+
+            # Update Q_table (the target depends only on choose_node, so duplicated
+            # (before_state, choose_node) pairs in a batch write the same value)
+            current_qv = q_table[before_states, choose_nodes]
+            new_qv = (current_qv
+                      + self.alpha
+                      * (self._ranku[choose_nodes]
+                         + self.gamma * row_max[current_states]
+                         - current_qv))
+            q_table[before_states, choose_nodes] = new_qv
+
+            # Update cached row maxima
+            decreased = (new_qv < current_qv) & (current_qv >= row_max[before_states])
+            np.maximum.at(row_max, before_states, new_qv)
+            if(decreased.any()):
+                rows = np.unique(before_states[decreased])
+                row_max[rows] = q_table[rows].max(axis=1)
+
+    def run(self, q_table: np.ndarray, num_of_episodes: int) -> None:
+        row_max = q_table.max(axis=1)
+        for start in range(0, num_of_episodes, self.batch_size):
+            self._run_batch(q_table, row_max, min(self.batch_size, num_of_episodes - start))
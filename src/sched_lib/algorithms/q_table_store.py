@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+from sched_lib.compiled_dag import CompiledDAG
+
+
+class QTableStore:
+    # Learned Q-tables on disk: <store_dir>/<structure hash>/<content hash>_<parameter hash>.npz
+    # Tables of the same DAG structure can warm-start each other even if the costs
+    # (e.g. CCR) or the parameters (e.g. inout_ratio) differ.
+
+    def __init__(self, store_dir: str, exact_keys: Tuple[str, ...] = ('alpha', 'gamma', 'q_table_backend')) -> None:
+        self.store_dir = store_dir
+        self.exact_keys = exact_keys
+        self._index = {}  # structure hash -> {filename: (content hash, params)}
+
+    @staticmethod
+    def get_structure_hash(dag: CompiledDAG) -> str:
+        sha256 = hashlib.sha256()
+        sha256.update(np.int64(dag.num_of_nodes).tobytes())
+        sha256.update(np.ascontiguousarray(dag.edge_src, dtype=np.int64).tobytes())
+        sha256.update(np.ascontiguousarray(dag.edge_dst, dtype=np.int64).tobytes())
+
+        return sha256.hexdigest()
+
+    @staticmethod
+    def get_content_hash(dag: CompiledDAG) -> str:
+        sha256 = hashlib.sha256(QTableStore.get_structure_hash(dag).encode())
+        sha256.update(np.ascontiguousarray(dag.exec, dtype=np.float64).tobytes())
+        sha256.update(np.ascontiguousarray(dag.comm, dtype=np.float64).tobytes())
+
+        return sha256.hexdigest()
+
+    @staticmethod
+    def _get_params_hash(params: Dict[str, float]) -> str:
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+    def _get_entries(self, structure_hash: str) -> Dict[str, Tuple[str, dict]]:
+        # Other processes may have added tables since the last call
+        entries = self._index.setdefault(structure_hash, {})
+        structure_dir = os.path.join(self.store_dir, structure_hash)
+        if(not os.path.isdir(structure_dir)):
+            return entries
+        for filename in os.listdir(structure_dir):
+            if(filename.endswith('.npz') and not filename.startswith('.') and filename not in entries):
+                with np.load(os.path.join(structure_dir, filename)) as npz:
+                    entries[filename] = (str(npz['content_hash']), json.loads(str(npz['params'])))
+
+        return entries
+
+    def _get_distance(self, params: Dict[str, float], other: Dict[str, float]) -> float:
+        if(any(params.get(k) != other.get(k) for k in self.exact_keys)):
+            return np.inf
+        distance = 0.0
+        for k in params.keys() | other.keys():
+            if(k in self.exact_keys):
+                continue
+            if(k not in params or k not in other):
+                return np.inf
+            # Ratios are compared on a log scale
+            if(params[k] > 0 and other[k] > 0):
+                distance += abs(np.log(params[k] / other[k]))
+            else:
+                distance += abs(params[k] - other[k])
+
+        return distance
+
+    def save(self, dag: CompiledDAG, params: Dict[str, float], q_table: np.ndarray) -> None:
+        structure_hash = self.get_structure_hash(dag)
+        content_hash = self.get_content_hash(dag)
+        structure_dir = os.path.join(self.store_dir, structure_hash)
+        os.makedirs(structure_dir, exist_ok=True)
+        filename = f'{content_hash[:16]}_{self._get_params_hash(params)[:16]}.npz'
+        tmp_path = os.path.join(structure_dir, f'.{filename}.tmp{os.getpid()}.npz')
+        np.savez(tmp_path, q_table=q_table, content_hash=content_hash, params=json.dumps(params, sort_keys=True))
+        os.replace(tmp_path, os.path.join(structure_dir, filename))
+        self._index.setdefault(structure_hash, {})[filename] = (content_hash, dict(params))
+
+    def find_nearest(self, dag: CompiledDAG, params: Dict[str, float]) -> Optional[Tuple[np.ndarray, dict, bool]]:
+        # Returns (q_table, params of the table, whether the DAG and the parameters are identical)
+        structure_hash = self.get_structure_hash(dag)
+        content_hash = self.get_content_hash(dag)
+        candidates = []
+        for filename, (other_content_hash, other_params) in self._get_entries(structure_hash).items():
+            distance = self._get_distance(params, other_params)
+            if(distance == np.inf):
+                continue
+            exact = (other_content_hash == content_hash and distance == 0)
+            candidates.append((not exact, distance, filename, other_params))
+        if(not candidates):
+            return None
+
+        not_exact, _, filename, other_params = min(candidates, key=lambda c: c[:3])
+        exact = not not_exact
+        with np.load(os.path.join(self.store_dir, structure_hash, filename)) as npz:
+            q_table = npz['q_table']
+
+        return q_table, other_params, exact
@@ -0,0 +1,126 @@
+import numpy as np
+from typing import List, Optional, Tuple
+
+from sched_lib.compiled_dag import CompiledDAG
+
+
+class RankEngine:
+    # Computes ranku / rankd in one pass over the CSR arrays of a CompiledDAG.
+    # exec / comm may carry a leading batch axis: (B, N) / (B, E), e.g. one comm vector per chromosome.
+    # A single cost vector is handled by a plain loop in topological order, and a batch is handled
+    # level by level: nodes of the same level do not depend on each other, so each level is
+    # a few NumPy operations over the whole batch.
+
+    def __init__(self, dag: CompiledDAG) -> None:
+        self._dag = dag
+        self._up_levels = None
+        self._down_levels = None
+
+    @staticmethod
+    def _get_levels(
+        ptr: np.ndarray,
+        eid: np.ndarray,
+        adj_idx: np.ndarray,
+        order: List[int]
+    ) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        # Level of a node = longest distance (in edges) to a node without adjacent nodes.
+        # Returns (nodes, edge ids, adjacent nodes, segment starts) of every level except level 0.
+        ptr_list = ptr.tolist()
+        adj_list = adj_idx.tolist()
+        heights = [0] * (len(ptr_list) - 1)
+        for idx in order:
+            for k in range(ptr_list[idx], ptr_list[idx+1]):
+                if(heights[adj_list[k]] + 1 > heights[idx]):
+                    heights[idx] = heights[adj_list[k]] + 1
+
+        heights = np.asarray(heights, dtype=np.int64)
+        nodes_by_height = np.argsort(heights, kind='stable')
+        level_ptr = np.concatenate(([0], np.cumsum(np.bincount(heights, minlength=1))))
+        levels = []
+        for h in range(1, len(level_ptr) - 1):
+            nodes = nodes_by_height[level_ptr[h]:level_ptr[h+1]]
+            counts = ptr[nodes+1] - ptr[nodes]
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            # Positions in the CSR arrays of the edges of nodes
+            positions = np.repeat(ptr[nodes] - starts, counts) + np.arange(counts.sum())
+            levels.append((nodes, eid[positions], adj_idx[positions], starts))
+
+        return levels
+
+    def _get_up_levels(self) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        if(self._up_levels is None):
+            self._up_levels = self._get_levels(self._dag.succ_ptr, self._dag.succ_eid, self._dag.succ_idx,
+                                               reversed(self._dag.topo_order.tolist()))
+        return self._up_levels
+
+    def _get_down_levels(self) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        if(self._down_levels is None):
+            self._down_levels = self._get_levels(self._dag.pred_ptr, self._dag.pred_eid, self._dag.pred_idx,
+                                                 self._dag.topo_order.tolist())
+        return self._down_levels
+
+    def _get_costs(self, exec_costs: Optional[np.ndarray], comm_costs: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        exec_costs = self._dag.exec if exec_costs is None else np.asarray(exec_costs)
+        comm_costs = self._dag.comm if comm_costs is None else np.asarray(comm_costs)
+        batch_shape = np.broadcast_shapes(exec_costs.shape[:-1], comm_costs.shape[:-1])
+        dtype = np.result_type(exec_costs, comm_costs) if comm_costs.size else exec_costs.dtype
+
+        return (np.broadcast_to(exec_costs, batch_shape + exec_costs.shape[-1:]).astype(dtype),
+                np.broadcast_to(comm_costs, batch_shape + comm_costs.shape[-1:]).astype(dtype))
+
+    def calc_ranku(self, exec_costs: Optional[np.ndarray] = None, comm_costs: Optional[np.ndarray] = None) -> np.ndarray:
+        # ranku(v) = exec(v) + max_{s in succ(v)} (comm(v, s) + ranku(s))
+        exec_costs, comm_costs = self._get_costs(exec_costs, comm_costs)
+        if(exec_costs.ndim == 1):
+            succ_ptr = self._dag.succ_ptr.tolist()
+            succ_idx = self._dag.succ_idx.tolist()
+            succ_comm = comm_costs[self._dag.succ_eid].tolist()
+            ranku = exec_costs.tolist()
+            for idx in reversed(self._dag.topo_order.tolist()):
+                max_value = 0
+                for k in range(succ_ptr[idx], succ_ptr[idx+1]):
+                    tmp = succ_comm[k] + ranku[succ_idx[k]]
+                    if(tmp > max_value):
+                        max_value = tmp
+                ranku[idx] += max_value
+
+            return np.asarray(ranku, dtype=exec_costs.dtype)
+
+        ranku = exec_costs.copy()
+        for nodes, eids, succs, starts in self._get_up_levels():
+            tmp = comm_costs[..., eids] + ranku[..., succs]
+            ranku[..., nodes] += np.maximum.reduceat(tmp, starts, axis=-1)
+
+        return ranku
+
+    def calc_rankd(self, exec_costs: Optional[np.ndarray] = None, comm_costs: Optional[np.ndarray] = None) -> np.ndarray:
+        # rankd(v) = max_{p in pred(v)} (rankd(p) + exec(p) + comm(p, v))
+        exec_costs, comm_costs = self._get_costs(exec_costs, comm_costs)
+        if(exec_costs.ndim == 1):
+            pred_ptr = self._dag.pred_ptr.tolist()
+            pred_idx = self._dag.pred_idx.tolist()
+            pred_comm = comm_costs[self._dag.pred_eid].tolist()
+            exec_list = exec_costs.tolist()
+            rankd = [0] * len(exec_list)
+            for idx in self._dag.topo_order.tolist():
+                for k in range(pred_ptr[idx], pred_ptr[idx+1]):
+                    pred = pred_idx[k]
+                    tmp = rankd[pred] + exec_list[pred] + pred_comm[k]
+                    if(tmp > rankd[idx]):
+                        rankd[idx] = tmp
+
+            return np.asarray(rankd, dtype=exec_costs.dtype)
+
+        rankd = np.zeros_like(exec_costs)
+        for nodes, eids, preds, starts in self._get_down_levels():
+            tmp = rankd[..., preds] + exec_costs[..., preds] + comm_costs[..., eids]
+            rankd[..., nodes] = np.maximum.reduceat(tmp, starts, axis=-1)
+
+        return rankd
+
+    def calc_critical_path_length(
+        self,
+        exec_costs: Optional[np.ndarray] = None,
+        comm_costs: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        return self.calc_ranku(exec_costs, comm_costs).max(axis=-1, initial=0)
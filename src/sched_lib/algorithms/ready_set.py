@@ -0,0 +1,43 @@
+from numpy import random as rnd
+from typing import List
+
+from sched_lib.compiled_dag import CompiledDAG
+
+
+class ReadySet:
+    # Nodes whose predecessors have all been chosen, maintained with remaining in-degree
+    # counters. Releasing the successors of a chosen node costs O(out-degree), and a node
+    # is removed by swapping it with the last ready node.
+    def __init__(self, dag: CompiledDAG) -> None:
+        self._succs = [dag.get_succs(idx).tolist() for idx in range(dag.num_of_nodes)]
+        self._in_degree = dag.in_degree.tolist()
+        self._remain_in_degree = []
+        self.nodes = []
+
+    def reset(self) -> None:
+        self._remain_in_degree = self._in_degree.copy()
+        self.nodes = []
+
+    def release(self, node_i: int) -> None:
+        # Called when node_i is chosen
+        for succ_i in self._succs[node_i]:
+            self._remain_in_degree[succ_i] -= 1
+            if(self._remain_in_degree[succ_i] == 0):
+                self.nodes.append(succ_i)
+
+    def pop(self, pos: int) -> int:
+        node_i = self.nodes[pos]
+        last_i = self.nodes.pop()
+        if(pos < len(self.nodes)):
+            self.nodes[pos] = last_i
+
+        return node_i
+
+    def pop_random(self) -> int:
+        return self.pop(int(rnd.random() * len(self.nodes)))
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def get_nodes(self) -> List[int]:
+        return self.nodes
@@ -0,0 +1,128 @@
+import numpy as np
+from typing import Tuple
+
+from sched_lib.compiled_dag import CompiledDAG
+
+
+class SparseQTable:
+    # Q-table that stores only the transitions state -> action that can occur, i.e.
+    # action can be chosen right after state in some topological order. That is the case iff
+    # action is not an ancestor of state and no descendant of state is an ancestor of action:
+    # the nodes incomparable to state plus the successors of state in the transitive reduction.
+    # Values of a state are kept in a CSR row aligned to its sorted candidate actions, and
+    # row maxima are cached. Every other entry is 0, as in the dense table.
+    # A stored transition takes 12 bytes (value and action) against 8 bytes per entry of the
+    # dense table, so the table is smaller only if less than 2/3 of the N^2 transitions can occur.
+    # On 2000-node layered DAGs it takes 11 MB (100 layers of 20 nodes) or 29 MB (20 layers of
+    # 100 nodes) against 32 MB. The bundled 40-100 node DAGs allow 83-90% of the transitions,
+    # so there it is larger than the dense table.
+
+    def __init__(self, dag: CompiledDAG) -> None:
+        self.num_of_nodes = dag.num_of_nodes
+        self.shape = (dag.num_of_nodes, dag.num_of_nodes)
+        cand_ptr, cand_idx = self._get_candidates(dag)
+        self.cand_ptr = cand_ptr
+        self.cand_idx = cand_idx
+        self.values = np.zeros(len(cand_idx), dtype=np.float64)
+        # Row pointers as Python ints for scalar lookups (O(N), unlike the candidates themselves)
+        self._row_ptr = cand_ptr.tolist()
+        # Position of the last looked up transition (an update reads and writes the same entry)
+        self._last_key = None
+        self._last_pos = -1
+        self._row_max = [0.0] * self.num_of_nodes
+
+    @staticmethod
+    def _get_candidates(dag: CompiledDAG) -> Tuple[np.ndarray, np.ndarray]:
+        # Ancestors / descendants as bitmasks (Python ints)
+        succ_ptr = dag.succ_ptr.tolist()
+        succ_idx = dag.succ_idx.tolist()
+        pred_ptr = dag.pred_ptr.tolist()
+        pred_idx = dag.pred_idx.tolist()
+        topo_order = dag.topo_order.tolist()
+        num_of_nodes = dag.num_of_nodes
+        anc = [0] * num_of_nodes
+        desc = [0] * num_of_nodes
+        for idx in topo_order:
+            for k in range(pred_ptr[idx], pred_ptr[idx+1]):
+                anc[idx] |= anc[pred_idx[k]] | (1 << pred_idx[k])
+        for idx in reversed(topo_order):
+            for k in range(succ_ptr[idx], succ_ptr[idx+1]):
+                desc[idx] |= desc[succ_idx[k]] | (1 << succ_idx[k])
+
+        num_of_bytes = (num_of_nodes + 7) // 8
+        all_nodes = (1 << num_of_nodes) - 1
+        cand_ptr = [0]
+        cand_list = []
+        for s in range(num_of_nodes):
+            mask = all_nodes & ~(anc[s] | desc[s] | (1 << s))
+            # Successors not reachable through another successor
+            indirect = 0
+            for k in range(succ_ptr[s], succ_ptr[s+1]):
+                indirect |= desc[succ_idx[k]]
+            for k in range(succ_ptr[s], succ_ptr[s+1]):
+                if(not (indirect >> succ_idx[k]) & 1):
+                    mask |= 1 << succ_idx[k]
+            bits = np.unpackbits(np.frombuffer(mask.to_bytes(num_of_bytes, 'little'), dtype=np.uint8), bitorder='little')
+            cands = np.flatnonzero(bits)
+            cand_list.append(cands)
+            cand_ptr.append(cand_ptr[-1] + len(cands))
+
+        cand_idx = np.concatenate(cand_list) if cand_list else np.zeros(0, dtype=np.int64)
+
+        return np.asarray(cand_ptr, dtype=np.int64), cand_idx.astype(np.int32)
+
+    def _get_pos(self, state: int, action: int) -> int:
+        if(self._last_key == (state, action)):
+            return self._last_pos
+        start, end = self._row_ptr[state], self._row_ptr[state+1]
+        pos = start + int(self.cand_idx[start:end].searchsorted(action))
+        if(pos == end or self.cand_idx[pos] != action):
+            pos = -1
+        self._last_key = (state, action)
+        self._last_pos = pos
+        return pos
+
+    def __getitem__(self, key: Tuple[int, int]) -> float:
+        pos = self._get_pos(*key)
+        return self.values[pos] if pos >= 0 else 0.0
+
+    def __setitem__(self, key: Tuple[int, int], value: float) -> None:
+        state, action = key
+        pos = self._get_pos(state, action)
+        if(pos < 0):
+            raise IndexError(f'({state}, {action}) is not a transition of the DAG.')
+        old_value = self.values[pos]
+        self.values[pos] = value
+        if(value >= self._row_max[state]):
+            self._row_max[state] = value
+        elif(old_value >= self._row_max[state]):
+            start, end = self._row_ptr[state], self._row_ptr[state+1]
+            self._row_max[state] = max(0.0, self.values[start:end].max())
+
+    def get_row_max(self, state: int) -> float:
+        return self._row_max[state]
+
+    def get_candidates(self, state: int) -> np.ndarray:
+        return self.cand_idx[self.cand_ptr[state]:self.cand_ptr[state+1]]
+
+    def _reset_row_max(self) -> None:
+        for s in range(self.num_of_nodes):
+            start, end = self.cand_ptr[s], self.cand_ptr[s+1]
+            self._row_max[s] = max(0.0, self.values[start:end].max()) if end > start else 0.0
+
+    def load(self, q_table: np.ndarray) -> None:
+        # Accepts a dense (N, N) table or the values of a SparseQTable of the same DAG structure
+        q_table = np.asarray(q_table)
+        if(q_table.shape == self.shape):
+            states = np.repeat(np.arange(self.num_of_nodes), np.diff(self.cand_ptr))
+            self.values[:] = q_table[states, self.cand_idx]
+        else:
+            self.values[:] = q_table
+        self._reset_row_max()
+
+    def to_dense(self) -> np.ndarray:
+        q_table = np.zeros(self.shape)
+        states = np.repeat(np.arange(self.num_of_nodes), np.diff(self.cand_ptr))
+        q_table[states, self.cand_idx] = self.values
+
+        return q_table
@@ -1,19 +1,49 @@
 import random
 import copy
+import math
 import time
 import numpy as np
 import networkx as nx
 import pandas as pd
-from typing import List
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
 
 from  sched_lib.algorithms.dag_utils import set_ranku, convert_to_virtual_entry_dag, convert_to_virtual_exit_dag
 from  sched_lib.algorithms.genetic_algorithm import Chromosome, GeneticAlgorithm
 from  sched_lib.processors.homogeneous.cluster import CluesteredProcessor
 from .QLHEFT import QLHEFT
-from  sched_lib.scheduler.list_scheduler import ListSchedulerToClusteredProcessor
+from  sched_lib.scheduler.list_scheduler import BatchListSchedulerToClusteredProcessor
+from sched_lib.compiled_dag import CompiledDAG
+from sched_lib.algorithms.q_table_store import QTableStore
+from sched_lib.checkpoint import save_checkpoint, load_checkpoint
+from sched_lib.exceptions import UnimplementedError
 from sched_lib.algorithms.static.num_learn import num_learn
 
 
+# CQGAHEFT instance shipped once to every fitness worker process
+_worker_cqgaheft = None
+
+
+def _init_fitness_worker(cqgaheft: 'CQGAHEFT') -> None:
+    global _worker_cqgaheft
+    _worker_cqgaheft = cqgaheft
+    # Fitness is evaluated serially inside a worker
+    _worker_cqgaheft._executor = None
+    # Without a seed, forked workers would all inherit the same NumPy random state
+    # and run correlated Q-learning rollouts
+    if(cqgaheft.seed is None):
+        np.random.seed()
+
+
+def _evaluate_gene_list_worker(gene_list: List[int], seed: Optional[int], q_table: Optional[np.ndarray]) -> Tuple[List[int], Optional[np.ndarray]]:
+    return _worker_cqgaheft._evaluate_gene_list(gene_list, seed, q_table)
+
+
+def _evolve_island_worker(island: tuple, num_of_generations: int) -> tuple:
+    return _worker_cqgaheft._evolve_island(island, num_of_generations)
+
+
 class CQGAHEFT(GeneticAlgorithm):
     def __init__(
         self,
@@ -23,70 +53,386 @@ class CQGAHEFT(GeneticAlgorithm):
         mutation_ratio: float,
         alpha: float,
         gamma: float,
-        processor: CluesteredProcessor
+        processor: CluesteredProcessor,
+        num_of_workers: int = 1,
+        seed: Optional[int] = None,
+        fitness_cache_size: int = 1024,
+        q_table_backend: str = 'dense',
+        num_of_islands: int = 1,
+        migration_interval: int = 5,
+        num_of_migrants: int = 1,
+        migration_topology: str = 'ring',
+        population_backend: str = 'object',
+        q_table_mode: str = 'retrain',
+        fine_tuning_ratio: float = 0.2,
+        q_table_cache_size: int = 64,
+        checkpoint_path: Optional[str] = None,
+        checkpoint_interval: int = 1
     ) -> None:
-        super().__init__(dag.number_of_edges(), [0,1], num_of_population, max_population, mutation_ratio)
+        if(migration_topology not in ['ring', 'fully_connected']):
+            raise UnimplementedError(f'migration topology "{migration_topology}" is not implemented.')
+        if(q_table_mode not in ['retrain', 'transfer']):
+            raise UnimplementedError(f'Q-table mode "{q_table_mode}" is not implemented.')
+        super().__init__(dag.number_of_edges(), [0,1], num_of_population, max_population, mutation_ratio, fitness_cache_size,
+                         population_backend)
         self.G = copy.deepcopy(dag)
+        # Population size given to the constructor (the size of later generations may differ)
+        self.num_of_population = num_of_population
         self.alpha = alpha
         self.gamma = gamma
+        self.q_table_backend = q_table_backend
         self.P = copy.deepcopy(processor)
+        self._batch_scheduler = BatchListSchedulerToClusteredProcessor(self.G, self.P)
         self._correspond_gene_edge = {}
-        for i in range(self.G.number_of_edges()):
-            self._correspond_gene_edge[str(i)] = list(self.G.edges)[i]
+        for i, edge in enumerate(self.G.edges):
+            self._correspond_gene_edge[str(i)] = edge
+        self.num_of_workers = num_of_workers
+        self.seed = seed
+        self.num_of_islands = num_of_islands
+        self.migration_interval = migration_interval
+        self.num_of_migrants = num_of_migrants
+        self.migration_topology = migration_topology
+        # q_table_mode='transfer' starts the QL-HEFT of a new chromosome from the Q-table of the
+        # nearest (Hamming distance) evaluated chromosome, usually a parent, and learns only
+        # fine_tuning_ratio of the episodes. q_table_mode='retrain' learns every chromosome from scratch.
+        self.q_table_mode = q_table_mode
+        self.fine_tuning_ratio = fine_tuning_ratio
+        self.q_table_cache_size = q_table_cache_size
+        # LRU cache of gene_key -> (genes, Q-values, sched_list) of evaluated chromosomes (transfer mode only)
+        self._q_table_cache = OrderedDict()
+        # The evolution is checkpointed to checkpoint_path every checkpoint_interval generations
+        # (at the end of an epoch in island mode) and resumed from it if it exists.
+        # With num_of_workers > 1, a resumed run gives the same result only if seed is given.
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self._num_of_checkpointed_generations = 0
+        self._executor = None
 
-    def _get_sched_list_from_chromosome(self, chromosome: Chromosome) -> List[int]:
+    def __getstate__(self) -> dict:
+        # The process pool itself is not shipped to the workers
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        return state
+
+    def _get_gene_list_seed(self, gene_list: List[int]) -> Optional[int]:
+        # Derived from the genes, so the fitness of a chromosome does not depend on
+        # which worker evaluates it or on the order of evaluation
+        if(self.seed is None):
+            return None
+        packed_genes = int.from_bytes(np.packbits(np.asarray(gene_list, dtype=np.uint8)).tobytes(), 'little')
+        seed_seq = np.random.SeedSequence([self.seed, len(gene_list), packed_genes])
+
+        return int(seed_seq.generate_state(1)[0])
+
+    def _learn_gene_list(self, gene_list: List[int], seed: Optional[int], q_table: Optional[np.ndarray] = None) -> QLHEFT:
         G = copy.deepcopy(self.G)
-        for i, v in enumerate(chromosome.gene_list):
+        for i, v in enumerate(gene_list):
             if(v == 1):
                 G.edges[self._correspond_gene_edge[str(i)]]['comm'] = int(G.edges[self._correspond_gene_edge[str(i)]]['comm'] * self.P.inout_ratio)
 
-        qlheft = QLHEFT(G, self.alpha, self.gamma)
-        qlheft.learn(str(G.number_of_nodes()))
+        if(seed is not None):
+            np.random.seed(seed)
+        qlheft = QLHEFT(G, self.alpha, self.gamma, q_table_backend=self.q_table_backend)
+        max_episode = num_learn[str(G.number_of_nodes())]
+        if(q_table is not None):
+            # Fine-tuning of a transferred Q-table
+            qlheft._load_q_table(q_table)
+            max_episode = math.ceil(max_episode * self.fine_tuning_ratio)
+        qlheft.learn(max_episode)
 
-        return qlheft.get_sched_list()
+        return qlheft
+
+    def _get_sched_list_from_gene_list(self, gene_list: List[int], seed: Optional[int], q_table: Optional[np.ndarray] = None) -> List[int]:
+        return self._learn_gene_list(gene_list, seed, q_table).get_sched_list()
+
+    def _evaluate_gene_list(self, gene_list: List[int], seed: Optional[int], q_table: Optional[np.ndarray]) -> Tuple[List[int], Optional[np.ndarray]]:
+        # Returns the sched_list and, in transfer mode, the learned Q-values
+        qlheft = self._learn_gene_list(gene_list, seed, q_table)
+        if(self.q_table_mode != 'transfer'):
+            return qlheft.get_sched_list(), None
+
+        return qlheft.get_sched_list(), qlheft._get_q_values().copy()
+
+    def _get_transfer_q_tables(self, gene_lists: List[List[int]]) -> List[Optional[np.ndarray]]:
+        # Q-values of the nearest cached chromosome of each gene list (None if the cache is empty)
+        if(self.q_table_mode != 'transfer' or not self._q_table_cache):
+            return [None] * len(gene_lists)
+        cached_entries = list(self._q_table_cache.values())
+        cached_genes = np.stack([genes for genes, _, _ in cached_entries])
+        q_tables = []
+        for gene_list in gene_lists:
+            distances = np.count_nonzero(cached_genes != np.asarray(gene_list, dtype=np.uint8), axis=1)
+            q_tables.append(cached_entries[int(np.argmin(distances))][1])
+
+        return q_tables
+
+    def _set_cached_q_table(self, gene_key: bytes, gene_list: List[int], q_table: np.ndarray, sched_list: List[int]) -> None:
+        self._q_table_cache[gene_key] = (np.asarray(gene_list, dtype=np.uint8), q_table, sched_list)
+        self._q_table_cache.move_to_end(gene_key)
+        while(len(self._q_table_cache) > self.q_table_cache_size):
+            self._q_table_cache.popitem(last=False)
+
+    def _get_sched_list_from_chromosome(self, chromosome: Chromosome) -> List[int]:
+        return self._get_sched_list_from_gene_list(chromosome.gene_list,
+                                                   self._get_gene_list_seed(chromosome.gene_list))
 
     def _calc_fitness(self) -> None:
-        for chromosome in self.population:
-            G = copy.deepcopy(self.G)
-            P = copy.deepcopy(self.P)
-            sched_list = self._get_sched_list_from_chromosome(chromosome)
-            S = ListSchedulerToClusteredProcessor(G, P, sched_list)
-            S.schedule()
-            chromosome.fitness = S.get_makespan()
+        # Only gene lists missing from the fitness cache are evaluated (each of them once)
+        gene_keys = self._get_gene_keys()
+        fitness_dict = {}
+        uncached_gene_lists = {}
+        for gene_key, gene_list in zip(gene_keys, self._get_gene_lists()):
+            if(gene_key in fitness_dict or gene_key in uncached_gene_lists):
+                continue
+            fitness = self._get_cached_fitness(gene_key)
+            if(fitness is None):
+                uncached_gene_lists[gene_key] = gene_list
+            else:
+                fitness_dict[gene_key] = fitness
+
+        # The current population stays the most recently used part of the Q-table cache
+        for gene_key in gene_keys:
+            if(gene_key in self._q_table_cache):
+                self._q_table_cache.move_to_end(gene_key)
+
+        # Donor Q-tables are chosen before any chromosome of this generation is evaluated,
+        # so the results do not depend on the order of evaluation
+        gene_lists = [list(map(int, gene_list)) for gene_list in uncached_gene_lists.values()]
+        seeds = [self._get_gene_list_seed(gene_list) for gene_list in gene_lists]
+        q_tables = self._get_transfer_q_tables(gene_lists)
+        if(self._executor is not None):
+            results = list(self._executor.map(_evaluate_gene_list_worker, gene_lists, seeds, q_tables))
+        else:
+            results = [self._evaluate_gene_list(gene_list, seed, q_table)
+                       for gene_list, seed, q_table in zip(gene_lists, seeds, q_tables)]
+        sched_lists = [sched_list for sched_list, _ in results]
+        fitness_list = self._batch_scheduler.evaluate(sched_lists).tolist()
+        for gene_key, gene_list, fitness, (sched_list, q_table) in zip(uncached_gene_lists.keys(), gene_lists, fitness_list, results):
+            fitness_dict[gene_key] = fitness
+            self._set_cached_fitness(gene_key, fitness)
+            if(q_table is not None):
+                self._set_cached_q_table(gene_key, gene_list, q_table, sched_list)
+
+        self._set_fitness_list([fitness_dict[gene_key] for gene_key in gene_keys])
         self.print_population()
 
     def evolution(self) -> None:
-        evolution_start_time = time.time()
+        if(self.num_of_workers > 1):
+            with ProcessPoolExecutor(max_workers=self.num_of_workers,
+                                     initializer=_init_fitness_worker,
+                                     initargs=(self,)) as executor:
+                self._executor = executor
+                try:
+                    self._run_evolution()
+                finally:
+                    self._executor = None
+        else:
+            self._run_evolution()
 
+    def _run_evolution(self) -> None:
+        if(self.num_of_islands > 1):
+            self._island_evolution()
+        else:
+            self._evolution()
+
+    def _next_generation(self) -> None:
+        self._reproduce()
         self._calc_fitness()
-        for _ in range(self.max_population):
-            offspring = self._elite_select(int(np.ceil(len(self.population) / 4)))
-
-            # crossover
-            children = []
-            for i in range(int(np.ceil((len(self.population)-len(offspring)) / 2))):
-                gene1 = random.choice(offspring)
-                gene2 = random.choice(offspring)
-                child1, child2 = self._single_point_crossover(gene1, gene2)
-                children.append(child1)
-                children.append(child2)  
-            offspring += children
-
-            self.population = offspring
-            self._mutate()
+
+    def _get_checkpoint_config(self) -> dict:
+        return {'dag_hash': QTableStore.get_content_hash(CompiledDAG(self.G)),
+                'num_of_nodes': self.G.number_of_nodes(),
+                'num_of_edges': self.G.number_of_edges(),
+                'num_of_clusters': self.P.num_of_clusters,
+                'num_of_cores': self.P.num_of_cores,
+                'inout_ratio': self.P.inout_ratio,
+                'num_of_population': self.num_of_population,
+                'max_population': self.max_population,
+                'mutation_ratio': self.mutation_ratio,
+                'alpha': self.alpha,
+                'gamma': self.gamma,
+                'seed': self.seed,
+                'fitness_cache_size': self.fitness_cache_size,
+                'q_table_backend': self.q_table_backend,
+                'num_of_islands': self.num_of_islands,
+                'migration_interval': self.migration_interval,
+                'num_of_migrants': self.num_of_migrants,
+                'migration_topology': self.migration_topology,
+                'population_backend': self.population_backend,
+                'q_table_mode': self.q_table_mode,
+                'fine_tuning_ratio': self.fine_tuning_ratio,
+                'q_table_cache_size': self.q_table_cache_size}
+
+    def _checkpoint(self, num_of_generations: int, evolution_start_time: float, islands: Optional[List[tuple]] = None) -> None:
+        if(self.checkpoint_path is None):
+            return
+        if(num_of_generations > 0 and num_of_generations < self.max_population
+           and num_of_generations - self._num_of_checkpointed_generations < self.checkpoint_interval):
+            return
+        genes, fitness = self._get_population_arrays()
+        state = {'num_of_generations': num_of_generations,
+                 'genes': genes,
+                 'fitness': fitness,
+                 'islands': islands,
+                 'random_state': random.getstate(),
+                 'np_random_state': np.random.get_state(),
+                 'fitness_cache': self._fitness_cache,
+                 'fitness_cache_hits': self.fitness_cache_hits,
+                 'fitness_cache_misses': self.fitness_cache_misses,
+                 'q_table_cache': self._q_table_cache,
+                 'elapsed_time': time.time() - evolution_start_time}
+        save_checkpoint(self.checkpoint_path, 'CQGAHEFT', self._get_checkpoint_config(), state)
+        self._num_of_checkpointed_generations = num_of_generations
+
+    def _resume(self) -> Optional[dict]:
+        # Restores the GA state from the checkpoint (None if there is no checkpoint yet)
+        if(self.checkpoint_path is None):
+            return None
+        checkpoint = load_checkpoint(self.checkpoint_path, 'CQGAHEFT', self._get_checkpoint_config())
+        if(checkpoint is None):
+            return None
+        self._set_population_arrays(checkpoint['genes'], checkpoint['fitness'])
+        random.setstate(checkpoint['random_state'])
+        np.random.set_state(checkpoint['np_random_state'])
+        self._fitness_cache = checkpoint['fitness_cache']
+        self.fitness_cache_hits = checkpoint['fitness_cache_hits']
+        self.fitness_cache_misses = checkpoint['fitness_cache_misses']
+        self._q_table_cache = checkpoint['q_table_cache']
+        self._num_of_checkpointed_generations = checkpoint['num_of_generations']
+
+        return checkpoint
+
+    def _evolution(self) -> None:
+        evolution_start_time = time.time()
+
+        checkpoint = self._resume()
+        if(checkpoint is None):
             self._calc_fitness()
-            
+            num_of_generations = 0
+            self._checkpoint(num_of_generations, evolution_start_time)
+        else:
+            num_of_generations = checkpoint['num_of_generations']
+            # Time spent before the resume is included
+            evolution_start_time -= checkpoint['elapsed_time']
+        while(num_of_generations < self.max_population):
+            self._next_generation()
+            num_of_generations += 1
+            self._checkpoint(num_of_generations, evolution_start_time)
+
+            # timeout
+            if(time.time() - evolution_start_time > 14400):
+                break
+
+        self.duration = time.time() - evolution_start_time
+
+    def _get_island_seed(self, island_id: int) -> int:
+        if(self.seed is None):
+            return random.getrandbits(32)
+        return int(np.random.SeedSequence([self.seed, island_id]).generate_state(1)[0])
+
+    def _init_islands(self) -> List[tuple]:
+        # Every island has its own population of num_of_population chromosomes, its own random state
+        # and its own fitness and Q-table caches. An island is (genes, fitness, random state, caches),
+        # independent of the population backend. With island-local caches, the results do not depend
+        # on which worker process evolves which island.
+        num_of_population = self.get_num_of_population()
+        island_seeds = [self._get_island_seed(island_id) for island_id in range(self.num_of_islands)]
+        main_random_state = random.getstate()
+        islands = []
+        for island_seed in island_seeds:
+            random.seed(island_seed)
+            self._new_population(num_of_population)
+            islands.append((*self._get_population_arrays(), random.getstate(), (OrderedDict(), OrderedDict())))
+        random.setstate(main_random_state)
+
+        return islands
+
+    def _evolve_island(self, island: tuple, num_of_generations: int) -> tuple:
+        # Runs in a worker process (or in this process) with the random state and the caches of the island
+        genes, fitness, random_state, caches = island
+        main_random_state = random.getstate()
+        main_caches = (self._fitness_cache, self._q_table_cache)
+        random.setstate(random_state)
+        self._fitness_cache, self._q_table_cache = caches
+        self._set_population_arrays(genes, fitness)
+        try:
+            if(-1 in self._get_fitness_list()):
+                self._calc_fitness()
+            for _ in range(num_of_generations):
+                self._next_generation()
+
+            return (*self._get_population_arrays(), random.getstate(), (self._fitness_cache, self._q_table_cache))
+        finally:
+            random.setstate(main_random_state)
+            self._fitness_cache, self._q_table_cache = main_caches
+
+    def _migrate(self, islands: List[tuple]) -> None:
+        # The best num_of_migrants chromosomes of each island replace the worst ones of its neighbors
+        num_of_islands = len(islands)
+        migrants = []
+        for genes, fitness, _, _ in islands:
+            order = np.argsort(fitness, kind='stable')[:self.num_of_migrants]
+            migrants.append((genes[order], fitness[order]))
+        for dest in range(num_of_islands):
+            if(self.migration_topology == 'ring'):
+                sources = [(dest - 1) % num_of_islands]
+            else:
+                sources = [src for src in range(num_of_islands) if src != dest]
+            genes, fitness, random_state, caches = islands[dest]
+            incoming_genes = np.concatenate([migrants[src][0] for src in sources])
+            incoming_fitness = np.concatenate([migrants[src][1] for src in sources])
+            order = np.argsort(incoming_fitness, kind='stable')[:max(0, len(genes) - 1)]
+            if(len(order) == 0):
+                continue
+            survivors = np.argsort(fitness, kind='stable')[:len(genes) - len(order)]
+            islands[dest] = (np.concatenate((genes[survivors], incoming_genes[order])),
+                             np.concatenate((fitness[survivors], incoming_fitness[order])),
+                             random_state, caches)
+
+    def _island_evolution(self) -> None:
+        evolution_start_time = time.time()
+
+        checkpoint = self._resume()
+        if(checkpoint is None):
+            islands = self._init_islands()
+            num_of_generations = 0
+            self._checkpoint(num_of_generations, evolution_start_time, islands)
+        else:
+            islands = checkpoint['islands']
+            num_of_generations = checkpoint['num_of_generations']
+            # Time spent before the resume is included
+            evolution_start_time -= checkpoint['elapsed_time']
+        while(num_of_generations < self.max_population):
+            num_of_epoch_generations = min(self.migration_interval, self.max_population - num_of_generations)
+            if(self._executor is not None):
+                futures = [self._executor.submit(_evolve_island_worker, island, num_of_epoch_generations)
+                           for island in islands]
+                islands = [future.result() for future in futures]
+            else:
+                islands = [self._evolve_island(island, num_of_epoch_generations) for island in islands]
+            num_of_generations += num_of_epoch_generations
+            self._migrate(islands)
+            self._checkpoint(num_of_generations, evolution_start_time, islands)
+
             # timeout
             if(time.time() - evolution_start_time > 14400):
                 break
 
+        self._set_population_arrays(np.concatenate([island[0] for island in islands]),
+                                    np.concatenate([island[1] for island in islands]))
+        for island in islands:
+            self._q_table_cache.update(island[3][1])
         self.duration = time.time() - evolution_start_time
 
     def get_sched_list(self) -> List[int]:
-        sorted_population = sorted(self.population, key=lambda x: x.fitness)
-        return self._get_sched_list_from_chromosome(sorted_population[0])
+        gene_list = self._get_best_gene_list()
+        # In transfer mode, the sched_list whose makespan was measured as the fitness
+        gene_key = self._get_gene_key(gene_list)
+        if(gene_key in self._q_table_cache):
+            return self._q_table_cache[gene_key][2]
+        return self._get_sched_list_from_gene_list(gene_list, self._get_gene_list_seed(gene_list))
 
     def print_population(self) -> None:
-        for i, chromosome in enumerate(self.population):
-            print(f'chromosome {i}: {chromosome.fitness}')
+        for i, fitness in enumerate(self._get_fitness_list()):
+            print(f'chromosome {i}: {fitness}')
         print('---------------------------------------')
@@ -3,6 +3,7 @@ import sys
 import networkx as nx
 from typing import List
 
+from sched_lib.compiled_dag import CompiledDAG
 from sched_lib.exceptions import UnimplementedError
 from sched_lib.algorithms.dag_utils import convert_to_ave_comm_dag, set_ranku
 from sched_lib.processors.homogeneous.cluster import CluesteredProcessor
@@ -66,20 +67,16 @@ class HTSTC:
                             break
             perform_clustering_flag = False
 
-    def _set_pre(self) -> None:
-        for node_i in self.G.nodes:
-            comm_plus_ranku_list = []
-            for succ_i in self.G.succ[node_i]:
-                comm_plus_ranku_list.append(self.G.edges[node_i, succ_i]['comm'] + self.G.nodes[succ_i]['ranku'])
-            if(comm_plus_ranku_list):
-                self.G.nodes[node_i]['pre'] = max(comm_plus_ranku_list)
-            else:
-                self.G.nodes[node_i]['pre'] = 0
+    def _set_pre(self, dag: CompiledDAG) -> None:
+        # pre(v) = max_{s in succ(v)} (comm(v, s) + ranku(s)) = ranku(v) - exec(v)
+        for node_i, exec_time in zip(dag.node_labels, dag.exec.tolist()):
+            self.G.nodes[node_i]['pre'] = self.G.nodes[node_i]['ranku'] - exec_time
 
     def get_sched_list(self) -> List[int]:
         self.task_clustering()
-        set_ranku(self.G)
-        self._set_pre()
+        dag = CompiledDAG(self.G)
+        set_ranku(self.G, dag)
+        self._set_pre(dag)
         pre_dict = nx.get_node_attributes(self.G, 'pre')
         sorted_by_pre = sorted(pre_dict.items(),
                                 key=lambda i: i[1],
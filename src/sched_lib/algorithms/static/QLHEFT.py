@@ -1,104 +1,457 @@
 import random
 import copy
+import math
 import time
 import networkx as nx
 import numpy as np
-from numpy import random as rnd
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
 
-from sched_lib.algorithms.dag_utils import set_ranku, convert_to_ave_comm_dag, convert_to_virtual_entry_dag, convert_to_virtual_exit_dag
+from sched_lib.checkpoint import save_checkpoint, load_checkpoint
+from sched_lib.compiled_dag import CompiledDAG
+from sched_lib.exceptions import UnimplementedError
+from sched_lib.algorithms.q_learning import BatchQLearningEngine
+from sched_lib.algorithms.q_table_store import QTableStore
+from sched_lib.algorithms.sparse_q_table import SparseQTable
+from sched_lib.algorithms.ready_set import ReadySet
+from sched_lib.algorithms.dag_utils import get_ccr, set_ranku, convert_to_ave_comm_dag, convert_to_virtual_entry_dag, convert_to_virtual_exit_dag
+
+
+# QLHEFT instance shipped once to every learning worker process
+_worker_qlheft = None
+
+
+def _init_learning_worker(qlheft: 'QLHEFT') -> None:
+    global _worker_qlheft
+    _worker_qlheft = qlheft
+
+
+def _learn_worker(shm_name: str, shape: Tuple[int, ...], worker_id: int, num_of_episodes: int, seed: int) -> None:
+    _worker_qlheft._learn_in_worker(shm_name, shape, worker_id, num_of_episodes, seed)
 
 
 class QLHEFT:
-    def __init__(self, dag: nx.DiGraph, alpha: float, gamma: float):
+    def __init__(
+        self,
+        dag: nx.DiGraph,
+        alpha: float,
+        gamma: float,
+        learning_engine: str = 'serial',
+        batch_size: int = 256,
+        q_table_store: Optional[QTableStore] = None,
+        warm_start_ratio: float = 0.2,
+        convergence_check: Optional[str] = None,
+        check_interval: int = 500,
+        convergence_window: int = 3,
+        convergence_tol: float = 1e-3,
+        q_table_backend: str = 'dense',
+        num_of_workers: int = 1,
+        sync_interval: int = 100,
+        seed: Optional[int] = None,
+        checkpoint_path: Optional[str] = None,
+        checkpoint_interval: int = 1000
+    ):
+        if(learning_engine not in ['serial', 'batch']):
+            raise UnimplementedError(f'learning engine "{learning_engine}" is not implemented.')
+        if(convergence_check not in [None, 'sched_list', 'q_delta']):
+            raise UnimplementedError(f'convergence check "{convergence_check}" is not implemented.')
+        if(q_table_backend not in ['dense', 'sparse']):
+            raise UnimplementedError(f'Q-table backend "{q_table_backend}" is not implemented.')
+        if(q_table_backend == 'sparse' and learning_engine == 'batch'):
+            raise UnimplementedError('The batch learning engine does not support the sparse Q-table backend.')
         self.G = copy.deepcopy(dag)
-        self._virtual_entry_i = convert_to_virtual_entry_dag(self.G)
-        self._virtual_exit_i = convert_to_virtual_exit_dag(self.G)
-        set_ranku(self.G)
+        virtual_entry = convert_to_virtual_entry_dag(self.G)
+        virtual_exit = convert_to_virtual_exit_dag(self.G)
+        self._dag = CompiledDAG(self.G)
+        # States and actions of the Q-table are node indices of self._dag, not node labels
+        self._virtual_entry_i = self._dag.node_index[virtual_entry]
+        self._virtual_exit_i = self._dag.node_index[virtual_exit]
+        set_ranku(self.G, self._dag)
         self.alpha = alpha
         self.gamma = gamma
-        self.q_table = np.zeros((self.G.number_of_nodes(), self.G.number_of_nodes()))
-        self._node_info_dict = self._get_node_info_dict()
+        self.q_table_backend = q_table_backend
+        if(q_table_backend == 'sparse'):
+            self.q_table = SparseQTable(self._dag)
+        else:
+            self.q_table = np.zeros((self.G.number_of_nodes(), self.G.number_of_nodes()))
+        self._node_info = self._get_node_info()
+        self.learning_engine = learning_engine
+        self.batch_size = batch_size
+        self.q_table_store = q_table_store
+        self.warm_start_ratio = warm_start_ratio
+        self.convergence_check = convergence_check
+        self.check_interval = check_interval
+        self.convergence_window = convergence_window
+        self.convergence_tol = convergence_tol
+        self.num_of_workers = num_of_workers
+        self.sync_interval = sync_interval
+        self.seed = seed
+        self._executor = None
+        self._learning_seed = None
+        self._num_of_rounds = 0
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self._num_of_done_episodes = 0
+        self._num_of_checkpointed_episodes = 0
+        self._num_of_stable_checks = 0
+        self._previous = None
+        self._max_episode = 0
+        self._learning_start_time = 0.0
         self.learning_log = {}
 
-    def _get_node_info_dict(self) -> dict:
-        node_info_dict = {}
-        for node_i in range(self.G.number_of_nodes()):
-            node_info_dict[str(node_i)] = {'succs': list(self.G.succ[node_i]),
-                                           'preds': set(self.G.pred[node_i]),
-                                           'ranku': self.G.nodes[node_i]['ranku']}
+    def __getstate__(self) -> dict:
+        # The process pool itself is not shipped to the workers
+        state = self.__dict__.copy()
+        state['_executor'] = None
+
+        return state
+
+    def _get_node_info(self) -> List[dict]:
+        # Indexed by node index of self._dag
+        node_info = []
+        for idx, node_i in enumerate(self._dag.node_labels):
+            node_info.append({'succs': self._dag.get_succs(idx).tolist(),
+                              'ranku': self.G.nodes[node_i]['ranku']})
+
+        return node_info
+
+    def _get_q_values(self) -> np.ndarray:
+        if(self.q_table_backend == 'sparse'):
+            return self.q_table.values
+        return self.q_table
+
+    def _load_q_table(self, q_table: np.ndarray) -> None:
+        if(self.q_table_backend == 'sparse'):
+            self.q_table.load(q_table)
+        else:
+            self.q_table[:] = q_table
 
-        return node_info_dict
+    def _get_max_qv(self, state: int) -> float:
+        if(self.q_table_backend == 'sparse'):
+            return self.q_table.get_row_max(state)
+        max_qv_action = np.argmax(self.q_table[state])
+        return self.q_table[state, max_qv_action]
+
+    def _get_store_params(self) -> Dict[str, float]:
+        params = {'alpha': self.alpha,
+                  'gamma': self.gamma,
+                  'ccr': round(float(get_ccr(self._dag)), 6)}
+        if(self.q_table_backend != 'dense'):
+            params['q_table_backend'] = self.q_table_backend
+
+        return params
+
+    def _warm_start(self, max_episode: int) -> int:
+        # Starts from the closest stored Q-table and returns the number of episodes to learn
+        found = self.q_table_store.find_nearest(self._dag, self._get_store_params())
+        if(found is None):
+            return max_episode
+        q_table, params, exact = found
+        self._load_q_table(q_table)
+        self.learning_log['warm_start'] = params
+        if(exact):
+            return 0
+        return math.ceil(max_episode * self.warm_start_ratio)
+
+    def _get_checkpoint_config(self, max_episode: int) -> dict:
+        config = self._get_store_params()
+        config.update({'dag_hash': QTableStore.get_content_hash(self._dag),
+                       'num_of_nodes': self._dag.num_of_nodes,
+                       'max_episode': max_episode,
+                       'learning_engine': self.learning_engine,
+                       'batch_size': self.batch_size,
+                       'convergence_check': self.convergence_check,
+                       'check_interval': self.check_interval,
+                       'num_of_workers': self.num_of_workers,
+                       'sync_interval': self.sync_interval,
+                       'seed': self.seed})
+
+        return config
+
+    def _save_learning_checkpoint(self, num_of_episodes: int) -> None:
+        state = {'num_of_episodes': num_of_episodes,
+                 'num_of_done_episodes': self._num_of_done_episodes,
+                 'num_of_stable_checks': self._num_of_stable_checks,
+                 'previous': self._previous,
+                 'q_values': self._get_q_values(),
+                 'np_random_state': np.random.get_state(),
+                 'learning_seed': self._learning_seed,
+                 'num_of_rounds': self._num_of_rounds,
+                 'learning_log': self.learning_log,
+                 'elapsed_time': time.time() - self._learning_start_time}
+        save_checkpoint(self.checkpoint_path, 'QLHEFT', self._get_checkpoint_config(self._max_episode), state)
+        self._num_of_checkpointed_episodes = self._num_of_done_episodes
+
+    def _resume_learning(self, max_episode: int) -> Optional[int]:
+        # Restores the learning state from the checkpoint and returns the number of episodes to learn
+        # (None if there is no checkpoint yet)
+        checkpoint = load_checkpoint(self.checkpoint_path, 'QLHEFT', self._get_checkpoint_config(max_episode))
+        if(checkpoint is None):
+            return None
+        self._load_q_table(checkpoint['q_values'])
+        np.random.set_state(checkpoint['np_random_state'])
+        self._num_of_done_episodes = checkpoint['num_of_done_episodes']
+        self._num_of_checkpointed_episodes = checkpoint['num_of_done_episodes']
+        self._num_of_stable_checks = checkpoint['num_of_stable_checks']
+        self._previous = checkpoint['previous']
+        self._learning_seed = checkpoint['learning_seed']
+        self._num_of_rounds = checkpoint['num_of_rounds']
+        self.learning_log = checkpoint['learning_log']
+        # Time spent before the resume is included
+        self._learning_start_time = time.time() - checkpoint['elapsed_time']
+
+        return checkpoint['num_of_episodes']
+
+    def _get_chunk_size(self, num_of_episodes: int) -> int:
+        # Episodes learned between two checkpoints. Rounded up to whole batches (batch engine)
+        # or whole rounds (parallel learning) so that a resumed run learns exactly as an uninterrupted one
+        if(self.checkpoint_path is None):
+            return num_of_episodes
+        unit = 1
+        if(self._executor is not None):
+            unit = self.num_of_workers * self.sync_interval
+        elif(self.learning_engine == 'batch'):
+            unit = self.batch_size
+        return max(1, math.ceil(self.checkpoint_interval / unit)) * unit
 
     def learn(self, max_episode: int) -> None:
-        learning_start_time = time.time()
+        self._max_episode = max_episode
+        self._learning_start_time = time.time()
+        self._num_of_done_episodes = 0
+        self._num_of_checkpointed_episodes = 0
+        self._num_of_stable_checks = 0
+        self._previous = None
+
+        num_of_episodes = None
+        if(self.checkpoint_path):
+            num_of_episodes = self._resume_learning(max_episode)
+        if(num_of_episodes is None):
+            num_of_episodes = max_episode
+            if(self.q_table_store):
+                num_of_episodes = self._warm_start(max_episode)
+            if(self.num_of_workers > 1):
+                # Seed of the worker rollouts (drawn from the global RNG if not given)
+                self._learning_seed = self.seed if self.seed is not None else int(np.random.randint(2**31))
+                self._num_of_rounds = 0
 
+        if(self.num_of_workers > 1):
+            with ProcessPoolExecutor(max_workers=self.num_of_workers,
+                                     initializer=_init_learning_worker,
+                                     initargs=(self,)) as executor:
+                self._executor = executor
+                try:
+                    num_of_episodes = self._learn_episodes(num_of_episodes)
+                finally:
+                    self._executor = None
+            self.learning_log['num_of_workers'] = self.num_of_workers
+            self.learning_log['num_of_rounds'] = self._num_of_rounds
+        else:
+            num_of_episodes = self._learn_episodes(num_of_episodes)
+
+        if(self.q_table_store and num_of_episodes > 0):
+            self.q_table_store.save(self._dag, self._get_store_params(), self._get_q_values())
+
+        # write learning_log
+        self.learning_log['duration'] = time.time() - self._learning_start_time
+        self.learning_log['num_episodes'] = num_of_episodes
+
+    def _checkpoint(self, num_of_episodes: int, finished: bool) -> None:
+        if(self.checkpoint_path is None):
+            return
+        if(finished or self._num_of_done_episodes - self._num_of_checkpointed_episodes >= self.checkpoint_interval):
+            self._save_learning_checkpoint(num_of_episodes)
+
+    def _learn_episodes(self, max_episode: int) -> int:
+        if(self.convergence_check):
+            return self._learn_until_convergence(max_episode)
+        while(self._num_of_done_episodes < max_episode):
+            num_of_chunk_episodes = min(self._get_chunk_size(max_episode), max_episode - self._num_of_done_episodes)
+            self._run_episodes(num_of_chunk_episodes)
+            self._num_of_done_episodes += num_of_chunk_episodes
+            self._checkpoint(max_episode, self._num_of_done_episodes >= max_episode)
+
+        return max_episode
+
+    def _run_episodes(self, num_of_episodes: int) -> None:
+        if(self._executor is not None):
+            self._learn_parallel(num_of_episodes)
+        else:
+            self._run_local_episodes(num_of_episodes)
+
+    def _run_local_episodes(self, num_of_episodes: int) -> None:
+        if(self.learning_engine == 'batch'):
+            self._learn_batch(num_of_episodes)
+        else:
+            self._learn_serial(num_of_episodes)
+
+    def _get_worker_seed(self, worker_id: int) -> int:
+        # Depends only on the learning seed, the round and the worker
+        seed_seq = np.random.SeedSequence([self._learning_seed, self._num_of_rounds, worker_id])
+        return int(seed_seq.generate_state(1)[0])
+
+    def _learn_parallel(self, num_of_episodes: int) -> None:
+        # Synchronous rounds: every worker copies the shared Q-table, runs its share of
+        # at most sync_interval episodes on its own copy, and the copies are averaged.
+        # Slot 0 of the shared memory holds the merged table and slot i+1 the copy of worker i.
+        q_values = self._get_q_values()
+        shape = (self.num_of_workers + 1,) + q_values.shape
+        shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+        try:
+            q_tables = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+            num_of_done = 0
+            while(num_of_done < num_of_episodes):
+                num_of_round_episodes = min(num_of_episodes - num_of_done, self.num_of_workers * self.sync_interval)
+                worker_episodes = [num_of_round_episodes // self.num_of_workers
+                                   + (1 if i < num_of_round_episodes % self.num_of_workers else 0)
+                                   for i in range(self.num_of_workers)]
+                active_workers = [i for i, n in enumerate(worker_episodes) if n > 0]
+                q_tables[0] = self._get_q_values()
+                futures = [self._executor.submit(_learn_worker, shm.name, shape, i, worker_episodes[i], self._get_worker_seed(i))
+                           for i in active_workers]
+                for future in futures:
+                    future.result()
+                self._load_q_table(q_tables[[i+1 for i in active_workers]].mean(axis=0))
+                num_of_done += num_of_round_episodes
+                self._num_of_rounds += 1
+            del q_tables
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def _learn_in_worker(self, shm_name: str, shape: Tuple[int, ...], worker_id: int, num_of_episodes: int, seed: int) -> None:
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            q_tables = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+            self._load_q_table(q_tables[0])
+            np.random.seed(seed)
+            self._run_local_episodes(num_of_episodes)
+            q_tables[worker_id+1] = self._get_q_values()
+            del q_tables
+        finally:
+            shm.close()
+
+    def _learn_until_convergence(self, max_episode: int) -> int:
+        # Learns check_interval episodes at a time and stops once the result has been
+        # stable for convergence_window consecutive checks. Returns the number of episodes run.
+        # Checkpoints are taken at checks only.
+        if(self._previous is None):
+            self.learning_log['converged'] = False
+            self._previous = self.get_sched_list() if self.convergence_check == 'sched_list' else self._get_q_values().copy()
+        while(self._num_of_done_episodes < max_episode and not self.learning_log['converged']):
+            num_of_chunk_episodes = min(self.check_interval, max_episode - self._num_of_done_episodes)
+            self._run_episodes(num_of_chunk_episodes)
+            self._num_of_done_episodes += num_of_chunk_episodes
+
+            if(self.convergence_check == 'sched_list'):
+                current = self.get_sched_list()
+                stable = (current == self._previous)
+            else:
+                current = self._get_q_values().copy()
+                q_norm = np.linalg.norm(current)
+                stable = (q_norm > 0 and np.linalg.norm(current - self._previous) / q_norm < self.convergence_tol)
+            self._previous = current
+            self._num_of_stable_checks = self._num_of_stable_checks + 1 if stable else 0
+            if(self._num_of_stable_checks >= self.convergence_window):
+                self.learning_log['converged'] = True
+            self._checkpoint(max_episode, self._num_of_done_episodes >= max_episode or self.learning_log['converged'])
+
+        return self._num_of_done_episodes
+
+    def _learn_batch(self, max_episode: int) -> None:
+        ranku = [node_info['ranku'] for node_info in self._node_info]
+        engine = BatchQLearningEngine(self._dag, ranku, self._virtual_entry_i,
+                                      self.alpha, self.gamma, self.batch_size)
+        engine.run(self.q_table, max_episode)
+
+    def _learn_serial(self, max_episode: int) -> None:
+        ready_set = ReadySet(self._dag)
         for _e in range(max_episode):
             # Initial setting
             current_state = self._virtual_entry_i
-            choose_nodes = {self._virtual_entry_i}
-            choosable_nodes = copy.copy(self._node_info_dict[str(current_state)]['succs'])
+            ready_set.reset()
+            ready_set.release(current_state)
 
             # Learning
             for _k in range(self.G.number_of_nodes() - 1):
                 # Choice node
-                rnd.shuffle(choosable_nodes)
-                choose_node = choosable_nodes.pop()
-                choose_nodes.add(choose_node)
+                choose_node = ready_set.pop_random()
                 before_state = current_state
                 current_state = choose_node
 
-                # Update choosable_nodes
-                add_options = set(self._node_info_dict[str(current_state)]['succs']) - set(choosable_nodes)
-                for add_option in add_options:
-                    if(self._node_info_dict[str(add_option)]['preds'] <= choose_nodes):
-                        choosable_nodes.append(add_option)
+                # Update ready_set
+                ready_set.release(current_state)
 
                 # Update Q_table
-                max_qv_action = np.argmax(self.q_table[current_state])
+                max_qv = self._get_max_qv(current_state)
                 self.q_table[before_state, choose_node] = (self.q_table[before_state, choose_node]
                                                            + self.alpha
-                                                           * (self._node_info_dict[str(choose_node)]['ranku']
+                                                           * (self._node_info[choose_node]['ranku']
                                                               + self.gamma
-                                                              * self.q_table[current_state, max_qv_action]
+                                                              * max_qv
                                                               - self.q_table[before_state, choose_node]))
 
-        # write learning_log
-        self.learning_log['duration'] = time.time() - learning_start_time
-
     def get_sched_list(self) -> List[int]:
         # Initial setting
         current_state = self._virtual_entry_i
         sched_list = [self._virtual_entry_i]
-        choosable_nodes = set(self.G.succ[current_state])
+        ready_set = ReadySet(self._dag)
+        ready_set.reset()
+        ready_set.release(current_state)
 
         while(len(sched_list) != self.G.number_of_nodes()):
-            # Choice node
+            # Choice node (ties are broken by the smaller node index)
             max_qv = -1
-            max_qv_action = None
-            for choosable_node in choosable_nodes:
-                if(self.q_table[current_state, choosable_node] > max_qv):
-                    max_qv = self.q_table[current_state, choosable_node]
-                    max_qv_action = choosable_node
-            choosable_nodes.remove(max_qv_action)
-            sched_list.append(max_qv_action)
-            current_state = max_qv_action
-            
-            # Update choosable_nodes
-            add_options = set(self.G.succ[current_state]) - set(sched_list) - choosable_nodes
-            for add_option in add_options:
-                if(not (set(self.G.pred[add_option]) <= set(sched_list))):
-                    continue
-                choosable_nodes.add(add_option)
+            max_qv_pos = None
+            for pos, ready_node in enumerate(ready_set.get_nodes()):
+                qv = self.q_table[current_state, ready_node]
+                if(qv > max_qv or (qv == max_qv and ready_node < ready_set.nodes[max_qv_pos])):
+                    max_qv = qv
+                    max_qv_pos = pos
+            current_state = ready_set.pop(max_qv_pos)
+            sched_list.append(current_state)
+
+            # Update ready_set
+            ready_set.release(current_state)
 
         # Remove virtual nodes
         sched_list.remove(self._virtual_entry_i)
         sched_list.remove(self._virtual_exit_i)
 
-        return sched_list
+        return [self._dag.node_labels[idx] for idx in sched_list]
 
 
 class QLHEFTToClusteredProcessor(QLHEFT):
-    def __init__(self, dag: nx.DiGraph, alpha: float, gamma: float, inout_ratio: float):
-        super().__init__(dag, alpha, gamma)
+    def __init__(
+        self,
+        dag: nx.DiGraph,
+        alpha: float,
+        gamma: float,
+        inout_ratio: float,
+        learning_engine: str = 'serial',
+        batch_size: int = 256,
+        q_table_store: Optional[QTableStore] = None,
+        warm_start_ratio: float = 0.2,
+        convergence_check: Optional[str] = None,
+        check_interval: int = 500,
+        convergence_window: int = 3,
+        convergence_tol: float = 1e-3,
+        q_table_backend: str = 'dense',
+        num_of_workers: int = 1,
+        sync_interval: int = 100,
+        seed: Optional[int] = None,
+        checkpoint_path: Optional[str] = None,
+        checkpoint_interval: int = 1000
+    ):
+        super().__init__(dag, alpha, gamma, learning_engine, batch_size, q_table_store, warm_start_ratio,
+                         convergence_check, check_interval, convergence_window, convergence_tol, q_table_backend,
+                         num_of_workers, sync_interval, seed, checkpoint_path, checkpoint_interval)
+        self.inout_ratio = inout_ratio
         convert_to_ave_comm_dag(self.G, inout_ratio)
+        self._dag = CompiledDAG(self.G)
+
+    def _get_store_params(self) -> Dict[str, float]:
+        params = super()._get_store_params()
+        params['inout_ratio'] = self.inout_ratio
+
+        return params
@@ -0,0 +1,41 @@
+import os
+import pickle
+from typing import Optional
+
+from .exceptions import Error
+
+
+# A checkpoint is a pickled dict {'kind', 'version', 'config', ...state}. 'config' holds the
+# parameters a run must share with the run that wrote the checkpoint in order to resume from it.
+VERSION = 1
+
+
+class CheckpointError(Error):
+    def __init__(self, message: str) -> None:
+        self.message = message
+
+
+def save_checkpoint(path: str, kind: str, config: dict, state: dict) -> None:
+    # Written to a temporary file and renamed, so a preempted write never leaves a broken checkpoint
+    dest_dir = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dest_dir, exist_ok=True)
+    tmp_path = os.path.join(dest_dir, f'.{os.path.basename(path)}.tmp{os.getpid()}')
+    checkpoint = {'kind': kind, 'version': VERSION, 'config': config}
+    checkpoint.update(state)
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path: str, kind: str, config: dict) -> Optional[dict]:
+    # Returns None if there is no checkpoint yet
+    if(not os.path.exists(path)):
+        return None
+    with open(path, 'rb') as f:
+        checkpoint = pickle.load(f)
+    if(checkpoint.get('kind') != kind or checkpoint.get('version') != VERSION):
+        raise CheckpointError(f'{path} is not a {kind} checkpoint (version {VERSION}).')
+    if(checkpoint['config'] != config):
+        raise CheckpointError(f'{path} was written by a run with different parameters: {checkpoint["config"]}')
+
+    return checkpoint
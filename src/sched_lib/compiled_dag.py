@@ -0,0 +1,99 @@
+import networkx as nx
+import numpy as np
+from typing import Hashable, List, Optional
+
+from .exceptions import AlgorithmError
+
+
+class CompiledDAG:
+    # Read-only array view of a DAG. Nodes are renumbered 0..N-1 in the order of G.nodes
+    # (see node_labels / node_index), and edge i corresponds to list(G.edges)[i].
+
+    def __init__(self, G: nx.DiGraph) -> None:
+        node_labels = list(G.nodes)
+        node_index = {node_i: idx for idx, node_i in enumerate(node_labels)}
+        exec_costs = [G.nodes[node_i]['exec'] for node_i in node_labels]
+        edge_src = []
+        edge_dst = []
+        comm_costs = []
+        for s, t, comm in G.edges(data='comm'):
+            edge_src.append(node_index[s])
+            edge_dst.append(node_index[t])
+            comm_costs.append(comm)
+
+        self._build(node_labels, exec_costs, edge_src, edge_dst, comm_costs)
+
+    @classmethod
+    def from_arrays(
+        cls,
+        exec_costs: np.ndarray,
+        edge_src: np.ndarray,
+        edge_dst: np.ndarray,
+        comm_costs: np.ndarray,
+        node_labels: Optional[List[Hashable]] = None
+    ) -> 'CompiledDAG':
+        dag = cls.__new__(cls)
+        if(node_labels is None):
+            node_labels = list(range(len(exec_costs)))
+        dag._build(node_labels, exec_costs, edge_src, edge_dst, comm_costs)
+
+        return dag
+
+    @staticmethod
+    def _read_only(array: np.ndarray) -> np.ndarray:
+        array = np.ascontiguousarray(array)
+        array.setflags(write=False)
+
+        return array
+
+    def _build(self, node_labels, exec_costs, edge_src, edge_dst, comm_costs) -> None:
+        self.node_labels = list(node_labels)
+        self.node_index = {node_i: idx for idx, node_i in enumerate(self.node_labels)}
+        self.num_of_nodes = len(self.node_labels)
+        self.exec = self._read_only(np.asarray(exec_costs))
+        self.edge_src = self._read_only(np.asarray(edge_src, dtype=np.int64))
+        self.edge_dst = self._read_only(np.asarray(edge_dst, dtype=np.int64))
+        self.comm = self._read_only(np.asarray(comm_costs))
+        self.num_of_edges = len(self.edge_src)
+
+        # Successor CSR (edges of a node keep their original order)
+        succ_eid = np.argsort(self.edge_src, kind='stable')
+        self.succ_ptr = self._read_only(np.concatenate(([0], np.cumsum(np.bincount(self.edge_src, minlength=self.num_of_nodes)))))
+        self.succ_eid = self._read_only(succ_eid)
+        self.succ_idx = self._read_only(self.edge_dst[succ_eid])
+        self.succ_comm = self._read_only(self.comm[succ_eid])
+
+        # Predecessor CSR
+        pred_eid = np.argsort(self.edge_dst, kind='stable')
+        self.pred_ptr = self._read_only(np.concatenate(([0], np.cumsum(np.bincount(self.edge_dst, minlength=self.num_of_nodes)))))
+        self.pred_eid = self._read_only(pred_eid)
+        self.pred_idx = self._read_only(self.edge_src[pred_eid])
+        self.pred_comm = self._read_only(self.comm[pred_eid])
+
+        self.in_degree = self._read_only(np.diff(self.pred_ptr))
+        self.out_degree = self._read_only(np.diff(self.succ_ptr))
+        self.entry_nodes = self._read_only(np.flatnonzero(self.in_degree == 0))
+        self.exit_nodes = self._read_only(np.flatnonzero(self.out_degree == 0))
+        self.topo_order = self._read_only(self._get_topo_order())
+
+    def _get_topo_order(self) -> np.ndarray:
+        succ_ptr = self.succ_ptr.tolist()
+        succ_idx = self.succ_idx.tolist()
+        remain_in_degree = self.in_degree.tolist()
+        topo_order = self.entry_nodes.tolist()
+        for idx in topo_order:
+            for k in range(succ_ptr[idx], succ_ptr[idx+1]):
+                succ = succ_idx[k]
+                remain_in_degree[succ] -= 1
+                if(remain_in_degree[succ] == 0):
+                    topo_order.append(succ)
+        if(len(topo_order) != self.num_of_nodes):
+            raise AlgorithmError('The graph contains a cycle.')
+
+        return np.asarray(topo_order, dtype=np.int64)
+
+    def get_succs(self, idx: int) -> np.ndarray:
+        return self.succ_idx[self.succ_ptr[idx]:self.succ_ptr[idx+1]]
+
+    def get_preds(self, idx: int) -> np.ndarray:
+        return self.pred_idx[self.pred_ptr[idx]:self.pred_ptr[idx+1]]
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import networkx as nx
+import numpy as np
+from typing import List, Optional
+
+from .compiled_dag import CompiledDAG
+from .exceptions import Error
+from .file_handling_helper import read_dag, get_dag_idx
+
+
+# Layout of a .dagb file:
+#   magic (8 bytes) | version (uint32) | header length (uint64) | JSON header | arrays
+# Every array starts at a multiple of _ALIGNMENT and is stored little-endian and contiguous,
+# so it can be memory-mapped directly. DAG i owns nodes node_ptr[i]:node_ptr[i+1] and
+# edges edge_ptr[i]:edge_ptr[i+1]; edge_src / edge_dst are indices local to the DAG.
+MAGIC = b'SCHEDDAG'
+VERSION = 1
+_ALIGNMENT = 64
+_PREAMBLE_SIZE = len(MAGIC) + 4 + 8
+
+
+class DAGCacheError(Error):
+    def __init__(self, message: str) -> None:
+        self.message = message
+
+
+def get_file_hash(file_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def write_dag_library(dag_file_paths: List[str], dest_path: str) -> None:
+    names = []
+    source_hashes = []
+    node_ptr = [0]
+    edge_ptr = [0]
+    node_labels, exec_costs, edge_src, edge_dst, comm_costs = [], [], [], [], []
+    for dag_file_path in dag_file_paths:
+        dag = CompiledDAG(read_dag(dag_file_path))
+        names.append(os.path.basename(dag_file_path))
+        source_hashes.append(get_file_hash(dag_file_path))
+        node_labels.append(np.asarray(dag.node_labels, dtype=np.int64))
+        exec_costs.append(dag.exec)
+        edge_src.append(dag.edge_src)
+        edge_dst.append(dag.edge_dst)
+        comm_costs.append(dag.comm)
+        node_ptr.append(node_ptr[-1] + dag.num_of_nodes)
+        edge_ptr.append(edge_ptr[-1] + dag.num_of_edges)
+
+    def _concat(arrays, dtype=None):
+        if(not arrays):
+            return np.zeros(0, dtype=dtype or np.int64)
+        return np.concatenate(arrays).astype(dtype or np.result_type(*arrays), copy=False)
+
+    arrays = {'node_ptr': np.asarray(node_ptr, dtype=np.int64),
+              'edge_ptr': np.asarray(edge_ptr, dtype=np.int64),
+              'node_labels': _concat(node_labels, np.int64),
+              'exec': _concat(exec_costs),
+              'edge_src': _concat(edge_src, np.int64),
+              'edge_dst': _concat(edge_dst, np.int64),
+              'comm': _concat(comm_costs)}
+
+    # Offsets are relative to the start of the array section
+    array_infos = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+        arrays[name] = array
+        array_infos[name] = {'offset': offset, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+        offset = _align(offset + array.nbytes)
+    header = json.dumps({'names': names,
+                         'source_hashes': source_hashes,
+                         'arrays': array_infos}).encode('utf-8')
+    data_start = _align(_PREAMBLE_SIZE + len(header))
+
+    # Write to a temporary file first so that readers never see a partial file
+    tmp_path = f'{dest_path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint32(VERSION).tobytes())
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + array_infos[name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, dest_path)
+
+
+class DAGLibrary:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, 'rb') as f:
+            preamble = f.read(_PREAMBLE_SIZE)
+            if(len(preamble) != _PREAMBLE_SIZE or preamble[:len(MAGIC)] != MAGIC):
+                raise DAGCacheError(f'{path} is not a DAG library file.')
+            version = int(np.frombuffer(preamble, dtype='<u4', count=1, offset=len(MAGIC))[0])
+            if(version != VERSION):
+                raise DAGCacheError(f'{path} has unsupported version {version}.')
+            header_len = int(np.frombuffer(preamble, dtype='<u8', count=1, offset=len(MAGIC) + 4)[0])
+            header = json.loads(f.read(header_len).decode('utf-8'))
+        data_start = _align(_PREAMBLE_SIZE + header_len)
+
+        self.names = header['names']
+        self.source_hashes = header['source_hashes']
+        self._arrays = {}
+        for name, info in header['arrays'].items():
+            if(int(np.prod(info['shape'])) == 0):
+                self._arrays[name] = np.zeros(info['shape'], dtype=info['dtype'])
+            else:
+                self._arrays[name] = np.memmap(path, dtype=info['dtype'], mode='r',
+                                               offset=data_start + info['offset'], shape=tuple(info['shape']))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def is_stale(self, dag_file_paths: List[str]) -> bool:
+        if([os.path.basename(p) for p in dag_file_paths] != self.names):
+            return True
+        return any(get_file_hash(p) != h for p, h in zip(dag_file_paths, self.source_hashes))
+
+    def get_compiled_dag(self, i: int) -> CompiledDAG:
+        # The exec / comm / edge arrays are views of the memory-mapped file
+        node_start, node_end = self._arrays['node_ptr'][i:i+2].tolist()
+        edge_start, edge_end = self._arrays['edge_ptr'][i:i+2].tolist()
+
+        return CompiledDAG.from_arrays(self._arrays['exec'][node_start:node_end],
+                                       self._arrays['edge_src'][edge_start:edge_end],
+                                       self._arrays['edge_dst'][edge_start:edge_end],
+                                       self._arrays['comm'][edge_start:edge_end],
+                                       self._arrays['node_labels'][node_start:node_end].tolist())
+
+    def get_dag(self, i: int) -> nx.DiGraph:
+        dag = self.get_compiled_dag(i)
+        G = nx.DiGraph()
+        for node_i, exec_time in zip(dag.node_labels, dag.exec.tolist()):
+            G.add_node(node_i, exec=exec_time)
+        for s, t, comm in zip(dag.edge_src.tolist(), dag.edge_dst.tolist(), dag.comm.tolist()):
+            G.add_edge(dag.node_labels[s], dag.node_labels[t], comm=comm)
+
+        return G
+
+
+def get_dag_file_paths(dag_dir: str) -> List[str]:
+    dag_file_paths = [os.path.join(dag_dir, f) for f in os.listdir(dag_dir)
+                      if os.path.isfile(os.path.join(dag_dir, f))]
+    return sorted(dag_file_paths, key=get_dag_idx)
+
+
+def load_dag_library(dag_dir: str, cache_path: Optional[str] = None, check_sources: bool = True) -> DAGLibrary:
+    # Packs dag_dir into cache_path if the cache is missing or does not match the source files
+    if(cache_path is None):
+        cache_path = f'{os.path.normpath(dag_dir)}.dagb'
+    dag_file_paths = get_dag_file_paths(dag_dir)
+    if(os.path.exists(cache_path)):
+        try:
+            library = DAGLibrary(cache_path)
+            if(not check_sources or not library.is_stale(dag_file_paths)):
+                return library
+        except DAGCacheError:
+            pass
+    write_dag_library(dag_file_paths, cache_path)
+
+    return DAGLibrary(cache_path)
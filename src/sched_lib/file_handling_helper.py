@@ -1,22 +1,84 @@
 import networkx as nx
 import os
+import re
+from typing import Tuple
 
 from .exceptions import UnimplementedError
 
 
-def read_dag(dag_file_path: str) -> nx.DiGraph:
-    _, ext = os.path.splitext(os.path.basename(dag_file_path))
+# Statements of the DOT dialect written by write_dag ("N [exec=..];", "s -> t [comm=..];")
+_DOT_HEADER_PATTERN = re.compile(r'^(strict\s+)?digraph\s*("[^"]*"|\w+)?\s*\{$')
+_DOT_NODE_PATTERN = re.compile(r'^"?(\d+)"?\s*(?:\[(.*)\])?\s*;?$')
+_DOT_EDGE_PATTERN = re.compile(r'^"?(\d+)"?\s*->\s*"?(\d+)"?\s*(?:\[(.*)\])?\s*;?$')
+_DOT_ATTR_PATTERN = re.compile(r'(\w+)\s*=\s*("[^"]*"|[^,;\s\]]+)')
 
-    if(ext == '.tgff'):
-        # Get "type" & "exec_time" of "@PE 5"
-        type_cost = []
-        read_flag = 0
-        info_flag = 0
-        f = open(dag_file_path, 'r')
+
+class _UnsupportedDotSyntax(Exception):
+    pass
+
+
+def _parse_dot_attrs(attrs_str: str) -> dict:
+    if(not attrs_str):
+        return {}
+    return {k: v.strip('"') for k, v in _DOT_ATTR_PATTERN.findall(attrs_str)}
+
+
+def _read_dot_fast(dag_file_path: str) -> nx.DiGraph:
+    # Single pass over the file. Raises _UnsupportedDotSyntax for anything outside the simple dialect.
+    G = nx.DiGraph()
+    with open(dag_file_path, 'r') as f:
         for line in f:
-            if(line == '\n'):
+            line = line.strip()
+            if(not line or line == '}' or _DOT_HEADER_PATTERN.match(line)):
                 continue
+            if(match := _DOT_EDGE_PATTERN.match(line)):
+                attrs = _parse_dot_attrs(match.group(3))
+                if('comm' not in attrs):
+                    raise _UnsupportedDotSyntax(line)
+                G.add_edge(int(match.group(1)), int(match.group(2)), comm=int(attrs['comm']))
+            elif(match := _DOT_NODE_PATTERN.match(line)):
+                attrs = _parse_dot_attrs(match.group(2))
+                if('exec' not in attrs):
+                    raise _UnsupportedDotSyntax(line)
+                G.add_node(int(match.group(1)), exec=int(attrs['exec']))
+            else:
+                raise _UnsupportedDotSyntax(line)
+
+    for node_i in G.nodes:
+        if('exec' not in G.nodes[node_i]):
+            raise _UnsupportedDotSyntax(f'node {node_i} has no exec.')
+
+    return G
+
+
+def _read_dot_pydot(dag_file_path: str) -> nx.DiGraph:
+    tmp_dag = nx.drawing.nx_pydot.read_dot(dag_file_path)
+    tmp_dag = nx.DiGraph(tmp_dag)
+    tmp_dag.remove_node('\\n')
+
+    G = nx.DiGraph()
+    for node_i in tmp_dag.nodes:
+        G.add_node(int(node_i), exec=int(tmp_dag.nodes[node_i]['exec']))
+    for s, t in tmp_dag.edges:
+        G.add_edge(int(s), int(t), comm=int(tmp_dag.edges[s, t]['comm']))
+
+    return G
+
+
+def _read_tgff(dag_file_path: str) -> nx.DiGraph:
+    # Single pass: TASK/ARC lines are recorded with their type index, and
+    # the costs of "@PE 5" (which may come later in the file) are resolved at the end.
+    type_cost = []
+    read_flag = 0
+    info_flag = 0
+    dag_lines = []
+    with open(dag_file_path, 'r') as f:
+        for line in f:
             line_list = line.split()
+            if(not line_list):
+                continue
+
+            # Get "type" & "exec_time" of "@PE 5"
             if(len(line_list) >= 2):
                 if(line_list[0] == '@PE' and line_list[1] == '5'):
                     read_flag = 1
@@ -28,44 +90,53 @@ def read_dag(dag_file_path: str) -> nx.DiGraph:
             elif(line_list[0] == '}'):
                 read_flag = 0
                 info_flag = 0
-        f.close()
 
-        # Create DAG
-        G = nx.DiGraph()
-        f = open(dag_file_path, 'r')
-        for line in f:
-            if(line == "\n"):
-                continue
-            line_list = line.split()
+            if(line_list[0] == 'TASK' or line_list[0] == 'ARC'):
+                dag_lines.append(line_list)
+
+    # Create DAG
+    G = nx.DiGraph()
+    for line_list in dag_lines:
+        # Add node
+        if(line_list[0] == 'TASK'):
+            G.add_node(G.number_of_nodes(), exec=type_cost[int(line_list[3])])
+
+        # Add edge
+        if(line_list[0] == 'ARC'):
+            source = int(line_list[3][3:])
+            target = int(line_list[5][3:])
+            G.add_edge(source, target, comm=type_cost[int(line_list[7])])
 
-            # Add node
-            if(line_list[0] == 'TASK'):
-                G.add_node(G.number_of_nodes(), exec=type_cost[int(line_list[3])])
+    return G
 
-            # Add edge
-            if(line_list[0] == 'ARC'):
-                source = int(line_list[3][3:])
-                target = int(line_list[5][3:])
-                G.add_edge(source, target, comm=type_cost[int(line_list[7])])
-        f.close()
 
-        return G
+def get_dag_idx(dag_file_path: str) -> Tuple[int, str]:
+    # Sort key of "dag_<idx>.<ext>" files
+    filename = os.path.basename(dag_file_path)
+    match = re.search(r'(\d+)\.[^.]+$', filename)
+    return (int(match.group(1)) if match else -1, filename)
 
+
+def read_dag(dag_file_path: str) -> nx.DiGraph:
+    _, ext = os.path.splitext(os.path.basename(dag_file_path))
+
+    if(ext == '.tgff'):
+        return _read_tgff(dag_file_path)
     if(ext == '.yaml'):
         pass  # TODO
     if(ext == '.json'):
         pass  # TODO
     if(ext == '.dot'):
-        tmp_dag = nx.drawing.nx_pydot.read_dot(dag_file_path)
-        tmp_dag = nx.DiGraph(tmp_dag)
-        tmp_dag.remove_node('\\n')
-
-        G = nx.DiGraph()
-        for node_i in tmp_dag.nodes:
-            G.add_node(int(node_i), exec=int(tmp_dag.nodes[node_i]['exec']))
-        for s, t in tmp_dag.edges:
-            G.add_edge(int(s), int(t), comm=int(tmp_dag.edges[s, t]['comm']))
-
-        return G
+        try:
+            return _read_dot_fast(dag_file_path)
+        except _UnsupportedDotSyntax:
+            return _read_dot_pydot(dag_file_path)
+    if(ext == '.dagb'):
+        # A packed library holding a single DAG (see dag_cache.py)
+        from .dag_cache import DAGLibrary
+        library = DAGLibrary(dag_file_path)
+        if(len(library) != 1):
+            raise UnimplementedError(f'{dag_file_path} holds {len(library)} DAGs. Use DAGLibrary to read it.')
+        return library.get_dag(0)
 
     raise UnimplementedError('')
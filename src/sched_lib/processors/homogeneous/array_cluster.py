@@ -0,0 +1,103 @@
+import heapq
+import numpy as np
+from typing import Tuple
+
+
+class ArrayClusteredProcessor:
+    def __init__(self, num_clusters, num_cores, inout_ratio):
+        self.num_of_cores = num_cores
+        self.num_of_clusters = num_clusters
+        self.inout_ratio = inout_ratio
+        self.current_time = 0
+        # Absolute time at which each core finishes its current node
+        self.available_time = np.zeros((num_clusters, num_cores), dtype=np.int64)
+        self.proc_node = np.full((num_clusters, num_cores), -1, dtype=np.int64)
+        # Per-cluster min-heaps: idle core IDs, and (available_time, core_id) of busy cores
+        self._idle_heaps = [list(range(1, num_cores+1)) for _ in range(num_clusters)]
+        self._busy_heaps = [[] for _ in range(num_clusters)]
+        # (allocation time, core_id) of cores whose last node has no execution time. As in Core,
+        # such a core never becomes idle and its remaining time goes negative until it is reused.
+        self._zero_heaps = [[] for _ in range(num_clusters)]
+
+    def clone(self) -> 'ArrayClusteredProcessor':
+        P = ArrayClusteredProcessor.__new__(ArrayClusteredProcessor)
+        P.num_of_cores = self.num_of_cores
+        P.num_of_clusters = self.num_of_clusters
+        P.inout_ratio = self.inout_ratio
+        P.current_time = self.current_time
+        P.available_time = self.available_time.copy()
+        P.proc_node = self.proc_node.copy()
+        P._idle_heaps = [heap.copy() for heap in self._idle_heaps]
+        P._busy_heaps = [heap.copy() for heap in self._busy_heaps]
+        P._zero_heaps = [heap.copy() for heap in self._zero_heaps]
+
+        return P
+
+    def __deepcopy__(self, memo) -> 'ArrayClusteredProcessor':
+        return self.clone()
+
+    def _release_finished_cores(self, cc_idx: int) -> None:
+        idle_heap = self._idle_heaps[cc_idx]
+        busy_heap = self._busy_heaps[cc_idx]
+        while(busy_heap and busy_heap[0][0] <= self.current_time):
+            _, core_id = heapq.heappop(busy_heap)
+            self.proc_node[cc_idx, core_id-1] = -1
+            heapq.heappush(idle_heap, core_id)
+
+    def process(self, elapsed_time: int = 1) -> None:
+        # Cores are released lazily when the cluster is next queried
+        self.current_time += elapsed_time
+
+    def get_shortest_remain(self, cc_id: int) -> Tuple[int, int]:
+        cc_idx = cc_id - 1
+        self._release_finished_cores(cc_idx)
+        zero_heap = self._zero_heaps[cc_idx]
+        if(zero_heap):
+            # Remaining time <= 0, ties broken by the smaller core_id as in Cluster
+            allocation_time, core_id = zero_heap[0]
+            remain = allocation_time - self.current_time
+            if(remain == 0 and self._idle_heaps[cc_idx] and self._idle_heaps[cc_idx][0] < core_id):
+                return 0, self._idle_heaps[cc_idx][0]
+            return remain, core_id
+        if(self._idle_heaps[cc_idx]):
+            return 0, self._idle_heaps[cc_idx][0]
+        available_time, core_id = self._busy_heaps[cc_idx][0]
+
+        return available_time - self.current_time, core_id
+
+    def allocate(self, cc_id: int, core_id: int, node_i: int, exec_time: int) -> None:
+        cc_idx = cc_id - 1
+        self._release_finished_cores(cc_idx)
+        idle_heap = self._idle_heaps[cc_idx]
+        busy_heap = self._busy_heaps[cc_idx]
+        zero_heap = self._zero_heaps[cc_idx]
+        if(zero_heap and any(zero_core_id == core_id for _, zero_core_id in zero_heap)):
+            zero_heap.remove((int(self.available_time[cc_idx, core_id-1]), core_id))
+            heapq.heapify(zero_heap)
+        elif(idle_heap and idle_heap[0] == core_id):
+            heapq.heappop(idle_heap)
+        elif(busy_heap and busy_heap[0][1] == core_id):
+            heapq.heappop(busy_heap)
+        elif(core_id in idle_heap):
+            idle_heap.remove(core_id)
+            heapq.heapify(idle_heap)
+        else:
+            busy_heap.remove((int(self.available_time[cc_idx, core_id-1]), core_id))
+            heapq.heapify(busy_heap)
+
+        available_time = self.current_time + exec_time
+        self.available_time[cc_idx, core_id-1] = available_time
+        self.proc_node[cc_idx, core_id-1] = node_i
+        if(exec_time == 0):
+            heapq.heappush(zero_heap, (available_time, core_id))
+        else:
+            heapq.heappush(busy_heap, (available_time, core_id))
+
+    def get_remain_proc_time(self) -> np.ndarray:
+        remain_proc_time = np.maximum(self.available_time - self.current_time, 0)
+        for cc_idx, zero_heap in enumerate(self._zero_heaps):
+            for allocation_time, core_id in zero_heap:
+                remain_proc_time[cc_idx, core_id-1] = allocation_time - self.current_time
+
+        return remain_proc_time
+
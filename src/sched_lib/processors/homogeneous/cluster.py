@@ -9,15 +9,24 @@ class Core:
         self.proc_node = -1
         self.remain_proc_time = 0
 
+    def clone(self) -> 'Core':
+        core = Core.__new__(Core)
+        core.__dict__.update(self.__dict__)
+
+        return core
+
     def allocate(self, node_i, exec_time) -> None:
         self.idle = False
         self.proc_node = node_i
         self.remain_proc_time = exec_time
 
-    def process(self) -> None:
+    def process(self, elapsed_time: int = 1) -> None:
         if(not self.idle):
-            self.remain_proc_time -= 1
-            if(self.remain_proc_time == 0):
+            before_remain_proc_time = self.remain_proc_time
+            self.remain_proc_time -= elapsed_time
+            # Same result as calling process() one unit at a time
+            if(before_remain_proc_time > 0 and self.remain_proc_time <= 0):
+                self.remain_proc_time = 0
                 self.idle = True
                 self.proc_node = -1
 
@@ -29,9 +38,16 @@ class Cluster:
         for core_id in range(1, num_cores+1):
             self.cores.append(Core(self.cc_id, core_id))
 
-    def process(self) -> None:
+    def clone(self) -> 'Cluster':
+        cluster = Cluster.__new__(Cluster)
+        cluster.cc_id = self.cc_id
+        cluster.cores = [core.clone() for core in self.cores]
+
+        return cluster
+
+    def process(self, elapsed_time: int = 1) -> None:
         for core in self.cores:
-            core.process()
+            core.process(elapsed_time)
 
     def get_shortest_remain(self) -> Tuple[int, int]:
         min_remain_proc_time = self.cores[0].remain_proc_time
@@ -53,9 +69,24 @@ class CluesteredProcessor:
         for cc_id in range(1, self.num_of_clusters+1):
             self.clusters.append(Cluster(cc_id, self.num_of_cores))
 
-    def process(self) -> None:
+    def clone(self) -> 'CluesteredProcessor':
+        P = CluesteredProcessor.__new__(CluesteredProcessor)
+        P.num_of_cores = self.num_of_cores
+        P.num_of_clusters = self.num_of_clusters
+        P.inout_ratio = self.inout_ratio
+        P.clusters = [cluster.clone() for cluster in self.clusters]
+
+        return P
+
+    def __deepcopy__(self, memo) -> 'CluesteredProcessor':
+        return self.clone()
+
+    def process(self, elapsed_time: int = 1) -> None:
         for cluster in self.clusters:
-            cluster.process()
+            cluster.process(elapsed_time)
 
     def get_shortest_remain(self, cc_id: int) -> Tuple[int, int]:
         return self.clusters[cc_id - 1].get_shortest_remain()
+
+    def allocate(self, cc_id: int, core_id: int, node_i: int, exec_time: int) -> None:
+        self.clusters[cc_id - 1].cores[core_id - 1].allocate(node_i, exec_time)
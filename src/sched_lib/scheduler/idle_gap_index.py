@@ -0,0 +1,143 @@
+import random
+import sys
+from typing import List, Optional, Tuple
+
+from sched_lib.exceptions import AlgorithmError
+
+
+class _GapNode:
+    __slots__ = ('start', 'end', 'priority', 'max_length', 'left', 'right')
+
+    def __init__(self, start: int, end: int, priority: float):
+        self.start = start
+        self.end = end
+        self.priority = priority
+        self.max_length = end - start
+        self.left = None
+        self.right = None
+
+    def update(self) -> None:
+        max_length = self.end - self.start
+        if(self.left is not None and self.left.max_length > max_length):
+            max_length = self.left.max_length
+        if(self.right is not None and self.right.max_length > max_length):
+            max_length = self.right.max_length
+        self.max_length = max_length
+
+
+class IdleGapIndex:
+    # Idle intervals [start, end) of a single core, kept in a treap ordered by start and
+    # augmented with the maximum gap length of every subtree.
+    # The last gap of a core is [finish time of its last task, INF).
+    INF = sys.maxsize
+
+    def __init__(self, seed: int = 0):
+        # Priorities come from a private generator, so the global random state is not consumed
+        self._rnd = random.Random(seed)
+        self._root = None
+        self._insert(0, IdleGapIndex.INF)
+
+    @staticmethod
+    def _split(node: Optional[_GapNode], start: int) -> Tuple[Optional[_GapNode], Optional[_GapNode]]:
+        # (gaps starting before start, gaps starting at or after start)
+        if(node is None):
+            return None, None
+        if(node.start < start):
+            node.right, right = IdleGapIndex._split(node.right, start)
+            node.update()
+            return node, right
+        left, node.left = IdleGapIndex._split(node.left, start)
+        node.update()
+        return left, node
+
+    @staticmethod
+    def _merge(left: Optional[_GapNode], right: Optional[_GapNode]) -> Optional[_GapNode]:
+        if(left is None):
+            return right
+        if(right is None):
+            return left
+        if(left.priority > right.priority):
+            left.right = IdleGapIndex._merge(left.right, right)
+            left.update()
+            return left
+        right.left = IdleGapIndex._merge(left, right.left)
+        right.update()
+        return right
+
+    def _insert(self, start: int, end: int) -> None:
+        left, right = IdleGapIndex._split(self._root, start)
+        self._root = IdleGapIndex._merge(IdleGapIndex._merge(left, _GapNode(start, end, self._rnd.random())), right)
+
+    def _remove(self, start: int) -> None:
+        left, right = IdleGapIndex._split(self._root, start)
+        _, right = IdleGapIndex._split(right, start + 1)
+        self._root = IdleGapIndex._merge(left, right)
+
+    def _find_containing(self, time: int) -> Optional[_GapNode]:
+        # The gap with the largest start < time (the only one that can contain time)
+        node = self._root
+        found = None
+        while(node is not None):
+            if(node.start < time):
+                found = node
+                node = node.right
+            else:
+                node = node.left
+
+        return found
+
+    @staticmethod
+    def _find_leftmost(node: Optional[_GapNode], time: int, length: int) -> Optional[_GapNode]:
+        # The first gap with start >= time and end - start >= length
+        if(node is None or node.max_length < length):
+            return None
+        if(node.start < time):
+            return IdleGapIndex._find_leftmost(node.right, time, length)
+        found = IdleGapIndex._find_leftmost(node.left, time, length)
+        if(found is not None):
+            return found
+        if(node.end - node.start >= length):
+            return node
+        return IdleGapIndex._find_leftmost(node.right, time, length)
+
+    def _find_gap(self, ready_time: int, exec_time: int) -> _GapNode:
+        gap = self._find_containing(ready_time)
+        if(gap is not None and gap.end - ready_time >= exec_time):
+            return gap
+        # The last gap is unbounded, so a gap is always found
+        return IdleGapIndex._find_leftmost(self._root, ready_time, exec_time)
+
+    def get_earliest_start_time(self, ready_time: int, exec_time: int) -> int:
+        # Earliest time >= ready_time at which the core is idle for exec_time
+        # (a task without execution time occupies nothing)
+        if(exec_time == 0):
+            return ready_time
+        return max(self._find_gap(ready_time, exec_time).start, ready_time)
+
+    def allocate(self, start_time: int, exec_time: int) -> None:
+        # Occupies [start_time, start_time + exec_time), which must lie inside one gap
+        if(exec_time == 0):
+            return
+        gap = self._find_gap(start_time, exec_time)
+        gap_start, gap_end = gap.start, gap.end
+        if(not (gap_start <= start_time and start_time + exec_time <= gap_end)):
+            raise AlgorithmError(f'[{start_time}, {start_time + exec_time}) is not idle.')
+        self._remove(gap_start)
+        if(gap_start < start_time):
+            self._insert(gap_start, start_time)
+        if(start_time + exec_time < gap_end):
+            self._insert(start_time + exec_time, gap_end)
+
+    def get_gaps(self) -> List[Tuple[int, int]]:
+        gaps = []
+        stack = []
+        node = self._root
+        while(stack or node is not None):
+            while(node is not None):
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            gaps.append((node.start, node.end))
+            node = node.right
+
+        return gaps
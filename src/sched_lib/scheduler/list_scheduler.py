@@ -1,21 +1,36 @@
-import json
 import copy
 import sys
 import networkx as nx
-from typing import List, Union
+import numpy as np
+from typing import List, Tuple, Union
 from abc import ABCMeta, abstractmethod
 
-from sched_lib.exceptions import AlgorithmError
+from sched_lib.compiled_dag import CompiledDAG
+from sched_lib.scheduler.idle_gap_index import IdleGapIndex
+from sched_lib.scheduler.sched_log import SchedLog
 
 
 class ListScheduler(metaclass=ABCMeta):
     def __init__(self, dag: nx.DiGraph, processor, sched_list: List[int]):
-        self.G = copy.deepcopy(dag)
-        self.P = copy.deepcopy(processor)
-        self.sched_list = copy.deepcopy(sched_list)
-        self.sched_log = {}
+        G = copy.deepcopy(dag)
+        self._init_state(G, CompiledDAG(G), copy.deepcopy(processor), copy.deepcopy(sched_list))
+
+    def _init_state(self, G: nx.DiGraph, dag: CompiledDAG, processor, sched_list: List[int]) -> None:
+        self.G = G
+        self.P = processor
+        self.sched_list = sched_list
+        self._dag = dag
+        self.sched_log = SchedLog(dag)
         self._current_time = 0
 
+    @classmethod
+    def _from_compiled(cls, G: nx.DiGraph, dag: CompiledDAG, processor, sched_list: List[int]) -> 'ListScheduler':
+        # Share an already copied graph and its compiled view (used for batch evaluation)
+        S = cls.__new__(cls)
+        S._init_state(G, dag, processor, sched_list)
+
+        return S
+
     @abstractmethod
     def schedule(self):
         pass
@@ -29,21 +44,19 @@ class ListScheduler(metaclass=ABCMeta):
         pass
 
     def _get_finish_time(self, node_i) -> int:
-        try:
-            return self.sched_log[str(node_i)]['finish_time']
-        except KeyError:
-            raise AlgorithmError(f'node {node_i} does not allocated.')
+        return self.sched_log.get_finish_time(node_i)
 
     def _wait_one(self) -> None:
-        self._current_time += 1
-        self.P.process()
+        self._wait_until(self._current_time + 1)
 
-    def get_makespan(self) -> int:
-        ft_list = []
-        for log in self.sched_log.values():
-             ft_list.append(log['finish_time'])
+    def _wait_until(self, time: int) -> None:
+        # Jump directly to the next event instead of advancing one unit at a time
+        if(time > self._current_time):
+            self.P.process(time - self._current_time)
+            self._current_time = time
 
-        return max(ft_list)
+    def get_makespan(self) -> int:
+        return self.sched_log.makespan
 
     def get_cpu_usage(self) -> float:
         sum_exec = 0
@@ -55,66 +68,134 @@ class ListSchedulerToClusteredProcessor(ListScheduler):
     def __init__(self, dag: nx.DiGraph, processor, sched_list: List[int]):
         super().__init__(dag, processor, sched_list)
 
+    def _init_state(self, G: nx.DiGraph, dag: CompiledDAG, processor, sched_list: List[int]) -> None:
+        super()._init_state(G, dag, processor, sched_list)
+        # Communication time of every predecessor edge between two different clusters
+        self._pred_inter_comm = (dag.pred_comm * processor.inout_ratio).astype(np.int64)
+        self._cc_ids = np.arange(1, processor.num_of_clusters+1, dtype=np.int64)[:, np.newaxis]
+
     def _get_allocated_cc_id(self, node_i) -> int:
-        try:
-            return self.sched_log[str(node_i)]['allocated_cc_id']
-        except KeyError:
-            raise AlgorithmError(f'node {node_i} does not allocated.')
+        return self.sched_log.get_allocated_cc_id(node_i)
+
+    def _get_latest_data_arrival_times(self, node_i) -> List[int]:
+        # Latest data arrival time of node_i on every cluster (cc_id - 1), computed at once
+        # from the finish times and clusters of its predecessors in sched_log
+        idx = self._dag.node_index[node_i]
+        start, end = self._dag.pred_ptr[idx], self._dag.pred_ptr[idx+1]
+        if(start == end):
+            return [self._current_time] * self.P.num_of_clusters
+        finish_times, allocated_cc_ids = self.sched_log.get_allocations(self._dag.pred_idx[start:end])
+        data_arrival_times = np.where(allocated_cc_ids == self._cc_ids,
+                                      finish_times + self._dag.pred_comm[start:end],
+                                      finish_times + self._pred_inter_comm[start:end]).max(axis=1)
+
+        return np.maximum(data_arrival_times, self._current_time).tolist()
 
     def _get_latest_data_arrival_time(self, cc_id, node_i) -> int:
-        latest_data_arrival_time = self._current_time
-        for pred_i in self.G.pred[node_i]:
-            comm_time = None
-            if(self._get_allocated_cc_id(pred_i) == cc_id):
-                comm_time = self.G.edges[pred_i, node_i]['comm']
-            else:
-                comm_time = int(self.G.edges[pred_i, node_i]['comm'] * self.P.inout_ratio)
-            data_arrival_time = self._get_finish_time(pred_i) + comm_time
-            if(data_arrival_time > latest_data_arrival_time):
-                latest_data_arrival_time = data_arrival_time
-
-        return latest_data_arrival_time
+        return self._get_latest_data_arrival_times(node_i)[cc_id-1]
 
     def _allocate_task(self, node_i, cc_id, core_id) -> None:
-        exec_time = self.G.nodes[node_i]['exec']
-        dest_cluster = self.P.clusters[cc_id-1]
-        dest_cluster.cores[core_id-1].allocate(node_i, exec_time)
-        self.sched_log[str(node_i)] = {'allocated_cc_id': cc_id,
-                                       'allocated_core_id': core_id,
-                                       'start_time': self._current_time,
-                                       'finish_time': self._current_time + exec_time}
+        exec_time = self._dag.exec[self._dag.node_index[node_i]].item()
+        self.P.allocate(cc_id, core_id, node_i, exec_time)
+        self.sched_log.append(node_i, cc_id, core_id, self._current_time, self._current_time + exec_time)
 
     def schedule(self) -> None:
-        while(self.sched_list):
-            head = self.sched_list.pop(0)
-
+        for head in self.sched_list:
             # Find the core that can be allocated most early
             dest_cc_id = None
             dest_core_id = None
             earliest_allocatable_time = sys.maxsize
-            for cluster in self.P.clusters:
-                latest_data_arrival_time = self._get_latest_data_arrival_time(cluster.cc_id, head)
-                shortest_remain, core_id = self.P.get_shortest_remain(cluster.cc_id)
+            latest_data_arrival_times = self._get_latest_data_arrival_times(head)
+            for cc_id, latest_data_arrival_time in enumerate(latest_data_arrival_times, 1):
+                shortest_remain, core_id = self.P.get_shortest_remain(cc_id)
                 allocatable_time = max(latest_data_arrival_time,
                                        self._current_time + shortest_remain)
                 if(allocatable_time < earliest_allocatable_time):
                     earliest_allocatable_time = allocatable_time
-                    dest_cc_id = cluster.cc_id
+                    dest_cc_id = cc_id
                     dest_core_id = core_id
 
-            while(self._current_time != earliest_allocatable_time):
-                self._wait_one()
+            self._wait_until(earliest_allocatable_time)
             self._allocate_task(head, dest_cc_id, dest_core_id)
 
     def dump_log_to_json(self, filename: str) -> None:
-        format_log = {'coreNum': self.P.num_of_clusters * self.P.num_of_cores,
-                      'makespan': self.get_makespan(),
-                      'taskSet': []}
-        for node_i, log in self.sched_log.items():
-            format_log['taskSet'].append({'coreID': self.P.num_of_cores * (log['allocated_cc_id']-1) + log['allocated_core_id'],
-                                          'taskName': f'task_{node_i}',
-                                          'startTime': log['start_time'],
-                                          'executionTime': log['finish_time'] - log['start_time']})
-
-        with open(f'{filename}.json', 'w') as fp:
-            json.dump(format_log, fp, indent=4)
+        self.sched_log.dump_json(f'{filename}.json', self.P.num_of_clusters * self.P.num_of_cores, self.P.num_of_cores)
+
+    def dump_log_to_csv(self, filename: str) -> None:
+        self.sched_log.dump_csv(f'{filename}.csv')
+
+    def dump_log_to_npy(self, filename: str) -> None:
+        self.sched_log.dump_npy(f'{filename}.npy')
+
+
+class InsertionListSchedulerToClusteredProcessor(ListSchedulerToClusteredProcessor):
+    # Insertion policy (as in the original HEFT): a task may be placed in an idle gap left
+    # between two tasks on a core, not only after the last task of the core.
+    # The schedule is built on a static timeline, so the processor is not simulated.
+    def __init__(self, dag: nx.DiGraph, processor, sched_list: List[int]):
+        super().__init__(dag, processor, sched_list)
+
+    def _init_state(self, G: nx.DiGraph, dag: CompiledDAG, processor, sched_list: List[int]) -> None:
+        super()._init_state(G, dag, processor, sched_list)
+        self._idle_gaps = [[IdleGapIndex() for _ in range(processor.num_of_cores)]
+                           for _ in range(processor.num_of_clusters)]
+        # Cores are used in ascending order of core_id, and the unused cores of a cluster are all
+        # idle from time 0, so only the used cores and the first unused one have to be queried
+        self._num_of_used_cores = [0] * processor.num_of_clusters
+
+    def _allocate_task(self, node_i, cc_id, core_id, start_time) -> None:
+        exec_time = self._dag.exec[self._dag.node_index[node_i]].item()
+        # sched_log is the only record of the allocation, and it rejects an already allocated
+        # node before the idle gaps are changed
+        self.sched_log.append(node_i, cc_id, core_id, start_time, start_time + exec_time)
+        self._idle_gaps[cc_id-1][core_id-1].allocate(start_time, exec_time)
+        self._num_of_used_cores[cc_id-1] = max(self._num_of_used_cores[cc_id-1], core_id)
+
+    def schedule(self) -> None:
+        for head in self.sched_list:
+            exec_time = self._dag.exec[self._dag.node_index[head]].item()
+
+            # Find the core that can start the task most early
+            dest_cc_id = None
+            dest_core_id = None
+            earliest_start_time = sys.maxsize
+            latest_data_arrival_times = self._get_latest_data_arrival_times(head)
+            for cc_id, latest_data_arrival_time in enumerate(latest_data_arrival_times, 1):
+                num_of_candidates = min(self._num_of_used_cores[cc_id-1] + 1, self.P.num_of_cores)
+                for core_id, idle_gaps in enumerate(self._idle_gaps[cc_id-1][:num_of_candidates], 1):
+                    start_time = idle_gaps.get_earliest_start_time(latest_data_arrival_time, exec_time)
+                    if(start_time < earliest_start_time):
+                        earliest_start_time = start_time
+                        dest_cc_id = cc_id
+                        dest_core_id = core_id
+
+            self._allocate_task(head, dest_cc_id, dest_core_id, earliest_start_time)
+
+
+class BatchListSchedulerToClusteredProcessor:
+    # Evaluates many sched_lists against one DAG and one processor configuration.
+    # The DAG is copied and compiled once and shared by every evaluation,
+    # and each evaluation only clones the processor.
+    def __init__(self, dag: nx.DiGraph, processor, scheduler_class=ListSchedulerToClusteredProcessor):
+        self.G = copy.deepcopy(dag)
+        self.P = copy.deepcopy(processor)
+        self._dag = CompiledDAG(self.G)
+        self._scheduler_class = scheduler_class
+
+    def evaluate(
+        self,
+        sched_lists: List[List[int]],
+        return_sched_logs: bool = False
+    ) -> Union[np.ndarray, Tuple[np.ndarray, List[SchedLog]]]:
+        makespans = []
+        sched_logs = []
+        for sched_list in sched_lists:
+            S = self._scheduler_class._from_compiled(self.G, self._dag, self.P.clone(), list(sched_list))
+            S.schedule()
+            makespans.append(S.get_makespan())
+            if(return_sched_logs):
+                sched_logs.append(S.sched_log)
+
+        if(return_sched_logs):
+            return np.asarray(makespans), sched_logs
+        return np.asarray(makespans)
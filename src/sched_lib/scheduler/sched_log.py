@@ -0,0 +1,110 @@
+import json
+import numpy as np
+from collections.abc import Mapping
+from typing import Iterator, Tuple
+
+from sched_lib.compiled_dag import CompiledDAG
+from sched_lib.exceptions import AlgorithmError
+
+
+SCHED_LOG_DTYPE = np.dtype([('node', np.int64),
+                            ('cc_id', np.int64),
+                            ('core_id', np.int64),
+                            ('start_time', np.int64),
+                            ('finish_time', np.int64)])
+
+
+class SchedLog(Mapping):
+    # Schedule result as a structured array with one record per allocated node (in allocation order).
+    # It is also a read-only mapping str(node_i) -> {'allocated_cc_id', 'allocated_core_id',
+    # 'start_time', 'finish_time'}, the format of the former dict of dicts.
+    WRITE_CHUNK_SIZE = 4096
+
+    def __init__(self, dag: CompiledDAG):
+        self._node_labels = dag.node_labels
+        self._node_index = dag.node_index
+        self._records = np.zeros(dag.num_of_nodes, dtype=SCHED_LOG_DTYPE)
+        # Row of every node (-1 until allocated), indexed like the compiled DAG
+        self._rows = np.full(dag.num_of_nodes, -1, dtype=np.int64)
+        self._size = 0
+        self.makespan = 0
+
+    def append(self, node_i, cc_id: int, core_id: int, start_time: int, finish_time: int) -> None:
+        idx = self._node_index[node_i]
+        if(self._rows[idx] != -1):
+            raise AlgorithmError(f'node {node_i} is already allocated.')
+        self._records[self._size] = (node_i, cc_id, core_id, start_time, finish_time)
+        self._rows[idx] = self._size
+        self._size += 1
+        if(finish_time > self.makespan):
+            self.makespan = finish_time
+
+    @property
+    def records(self) -> np.ndarray:
+        return self._records[:self._size]
+
+    def _get_row(self, node_i) -> int:
+        idx = self._node_index.get(node_i)
+        if(idx is None or self._rows[idx] == -1):
+            raise AlgorithmError(f'node {node_i} does not allocated.')
+        return self._rows[idx]
+
+    def get_finish_time(self, node_i) -> int:
+        return int(self._records['finish_time'][self._get_row(node_i)])
+
+    def get_allocated_cc_id(self, node_i) -> int:
+        return int(self._records['cc_id'][self._get_row(node_i)])
+
+    def get_allocations(self, idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Finish times and cc_ids of the nodes with the compiled indices idx
+        rows = self._rows[idx]
+        if((rows < 0).any()):
+            raise AlgorithmError(f'node {self._node_labels[idx[np.argmax(rows < 0)]]} does not allocated.')
+        records = self._records[rows]
+        return records['finish_time'], records['cc_id']
+
+    def __getitem__(self, key: str) -> dict:
+        try:
+            node, cc_id, core_id, start_time, finish_time = self._records[self._get_row(int(key))].tolist()
+        except (AlgorithmError, ValueError):
+            raise KeyError(key)
+        return {'allocated_cc_id': cc_id,
+                'allocated_core_id': core_id,
+                'start_time': start_time,
+                'finish_time': finish_time}
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(node) for node in self.records['node'].tolist())
+
+    def __len__(self) -> int:
+        return self._size
+
+    def dump_json(self, path: str, core_num: int, num_of_cores: int) -> None:
+        # Written record by record, one task per line (the format read by SchedulingViewer)
+        with open(path, 'w') as f:
+            f.write('{\n')
+            f.write(f'    "coreNum": {json.dumps(core_num)},\n')
+            f.write(f'    "makespan": {json.dumps(self.makespan)},\n')
+            f.write('    "taskSet": [')
+            separator = '\n'
+            for chunk_start in range(0, self._size, SchedLog.WRITE_CHUNK_SIZE):
+                chunk = self.records[chunk_start:chunk_start + SchedLog.WRITE_CHUNK_SIZE]
+                core_ids = (num_of_cores * (chunk['cc_id'] - 1) + chunk['core_id']).tolist()
+                lines = []
+                for core_id, node, start_time, finish_time in zip(core_ids, chunk['node'].tolist(),
+                                                                  chunk['start_time'].tolist(), chunk['finish_time'].tolist()):
+                    lines.append(f'{separator}        {{"coreID": {core_id}, "taskName": "task_{node}", '
+                                 f'"startTime": {start_time}, "executionTime": {finish_time - start_time}}}')
+                    separator = ',\n'
+                f.write(''.join(lines))
+            f.write('\n    ]\n}\n')
+
+    def dump_csv(self, path: str) -> None:
+        with open(path, 'w') as f:
+            f.write(','.join(SCHED_LOG_DTYPE.names) + '\n')
+            for chunk_start in range(0, self._size, SchedLog.WRITE_CHUNK_SIZE):
+                chunk = self.records[chunk_start:chunk_start + SchedLog.WRITE_CHUNK_SIZE]
+                np.savetxt(f, chunk, fmt='%d', delimiter=',')
+
+    def dump_npy(self, path: str) -> None:
+        np.save(path, self.records)
@@ -1,5 +1,6 @@
+import argparse
 import json
-from sys import argv
+import re
 
 class SchedulingViewer:
 	OFFSET_X = 0
@@ -12,45 +13,167 @@ class SchedulingViewer:
 
 	color_list = ["AliceBlue","AntiqueWhite","Aqua","Aquamarine","Azure","Beige","Bisque","Black","BlanchedAlmond","Blue","BlueViolet","Brown","BurlyWood","CadetBlue","Chartreuse","Chocolate","Coral","CornflowerBlue","Cornsilk","Crimson","Cyan","DarkBlue","DarkCyan","DarkGoldenRod","DarkGray","DarkGreen","DarkGrey","DarkKhaki","DarkMagenta","DarkOliveGreen","Darkorange","DarkOrchid","DarkRed","DarkSalmon","DarkSeaGreen","DarkSlateBlue","DarkSlateGray","DarkSlateGrey","DarkTurquoise","DarkViolet","DeepPink","DeepSkyBlue","DimGray","DimGrey","DodgerBlue","FireBrick","FloralWhite","ForestGreen","Fuchsia","Gainsboro","GhostWhite","Gold","GoldenRod","Gray","Green","GreenYellow","Grey","HoneyDew","HotPink","IndianRed","Indigo","Ivory","Khaki","Lavender","LavenderBlush","LawnGreen","LemonChiffon","LightBlue","LightCoral","LightCyan","LightGoldenRodYello","LightGray","LightGreen","LightGrey","LightPink","LightSalmon","LightSeaGreen","LightSkyBlue","LightSlateGray","LightSlateGrey","LightSteelBlue","LightYellow","Lime","LimeGreen","Linen","Magenta","Maroon","MediumAquaMarine","MediumBlue","MediumOrchid","MediumPurple","MediumSeaGreen","MediumSlateBlue","MediumSpringGreen","MediumTurquoise","MediumVioletRed","MidnightBlue","MintCream","MistyRose","Moccasin","NavajoWhite","Navy","OldLace","Olive","OliveDrab","Orange","OrangeRed","Orchid","PaleGoldenRod","PaleGreen","PaleTurquoise","PaleVioletRed","PapayaWhip","PeachPuff","Peru","Pink","Plum","PowderBlue","Purple","Red","RosyBrown","RoyalBlue","SaddleBrown","Salmon","SandyBrown","SeaGreen","SeaShell","Sienna","Silver","SkyBlue","SlateBlue","SlateGray","SlateGrey","Snow","SpringGreen","SteelBlue","Tan","Teal","Thistle","Tomato","Turquoise","Violet","Wheat","White","WhiteSmoke","Yellow","YellowGreen"]
 
-	def __init__(self, input_filename, output_filename, ex_rate):
+	# Streaming rendering: tasks are read one by one from the schedule file and written through
+	# a single buffered output file. With level_of_detail, tasks narrower than min_task_width
+	# (in SVG units) are merged into one aggregated block per core. time_window=(start, end)
+	# renders only that part of the timeline, so a large schedule can be rendered in tiles.
+	READ_CHUNK_SIZE = 1 << 20
+	WRITE_BUFFER_SIZE = 1 << 20
+
+	def __init__(self, input_filename, output_filename, ex_rate, time_window=None, level_of_detail=False, min_task_width=10.0):
 		self.input_filename = input_filename
 		self.output_filename = output_filename
 		self.color_count = 0
 		self.color_hash = {}
+		self.time_window = time_window
+		self.level_of_detail = level_of_detail
+		self.min_task_width = min_task_width
+		self.output_file = None
+		self._blocks = {}
 
+		self.core_num, self.makespan = self.read_header()
 		if ex_rate == 0:
-			json_file = open(self.input_filename)
-			json_data = json.load(json_file)
-			ex_rate = 96 / json_data["makespan"]
+			ex_rate = 96 / self.get_window_length()
 			print("ex_rate    : auto_fix")
 
 		SchedulingViewer.WIDTH *= ex_rate
 		print("ex_rate    : "+str(ex_rate))
 
+	def read_header(self):
+		# coreNum and makespan precede taskSet in the files written by the schedulers
+		with open(self.input_filename) as json_file:
+			text = ""
+			while "\"taskSet\"" not in text:
+				chunk = json_file.read(SchedulingViewer.READ_CHUNK_SIZE)
+				if not chunk:
+					break
+				text += chunk
+		core_num = re.search(r'"coreNum"\s*:\s*(\d+)', text.split("\"taskSet\"")[0])
+		makespan = re.search(r'"makespan"\s*:\s*(\d+)', text.split("\"taskSet\"")[0])
+		if core_num is None or makespan is None:
+			with open(self.input_filename) as json_file:
+				json_data = json.load(json_file)
+			return json_data["coreNum"], json_data["makespan"]
+		return int(core_num.group(1)), int(makespan.group(1))
+
+	def iter_tasks(self):
+		# Decodes the task objects of taskSet one at a time without loading the whole file
+		decoder = json.JSONDecoder()
+		with open(self.input_filename) as json_file:
+			buffer = ""
+			pos = -1
+			while pos == -1:
+				chunk = json_file.read(SchedulingViewer.READ_CHUNK_SIZE)
+				if not chunk:
+					return
+				buffer += chunk
+				pos = buffer.find("\"taskSet\"")
+			# The chunk may end before the "[" of taskSet
+			while buffer.find("[", pos) == -1:
+				chunk = json_file.read(SchedulingViewer.READ_CHUNK_SIZE)
+				if not chunk:
+					return
+				buffer += chunk
+			pos = buffer.find("[", pos) + 1
+			eof = False
+			while True:
+				while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+					pos += 1
+				if pos < len(buffer) and buffer[pos] == "]":
+					return
+				try:
+					task, end = decoder.raw_decode(buffer, pos)
+				except ValueError:
+					if eof:
+						raise
+					chunk = json_file.read(SchedulingViewer.READ_CHUNK_SIZE)
+					eof = not chunk
+					buffer = buffer[pos:] + chunk
+					pos = 0
+					continue
+				yield task
+				pos = end
+
+	def get_window_length(self):
+		if self.time_window is None:
+			return self.makespan
+		return self.time_window[1] - self.time_window[0]
+
+	def get_window_start(self):
+		if self.time_window is None:
+			return 0
+		return self.time_window[0]
+
 	def print_svg(self):
-		json_file = open(self.input_filename)
-		json_data = json.load(json_file)
-		self.core_num = json_data["coreNum"]
-		self.makespan = json_data["makespan"]
+		self.output_file = open(self.output_filename, "w", buffering=SchedulingViewer.WRITE_BUFFER_SIZE)
+		try:
+			self.write_header(self.core_num * SchedulingViewer.HEIGHT, self.get_window_length() * SchedulingViewer.WIDTH + SchedulingViewer.OFFSET_X)
+			self.draw_lines(self.core_num * SchedulingViewer.HEIGHT, self.get_window_length())
 
-		self.write_header(self.core_num * SchedulingViewer.HEIGHT, self.makespan * SchedulingViewer.WIDTH + SchedulingViewer.OFFSET_X)
-		self.draw_lines(self.core_num * SchedulingViewer.HEIGHT, self.makespan)
-		
-		for task in json_data["taskSet"]:
-			self.draw_task(task["coreID"], task["taskName"], task["startTime"], task["executionTime"])
-		  #for test
-		  #100.times{|i|
-		#	draw_task(rand(10),"task_#{i}", rand(100), rand(500)+10)
-		#  }
-		self.write_script()
-		self.write_footer()
+			for task in self.iter_tasks():
+				self.render_task(task["coreID"], task["taskName"], task["startTime"], task["executionTime"])
+			self.flush_blocks()
+			  #for test
+			  #100.times{|i|
+			#	draw_task(rand(10),"task_#{i}", rand(100), rand(500)+10)
+			#  }
+			self.write_script()
+			self.write_footer()
+		finally:
+			self.output_file.close()
+			self.output_file = None
+
+	def render_task(self, core_id, task_name, start_time, exection_time):
+		# Clip to the time window
+		if self.time_window is not None:
+			window_start, window_end = self.time_window
+			finish_time = start_time + exection_time
+			if finish_time <= window_start or start_time >= window_end:
+				return
+			start_time = max(start_time, window_start)
+			exection_time = min(finish_time, window_end) - start_time
 
+		if self.level_of_detail and exection_time * SchedulingViewer.WIDTH < self.min_task_width:
+			self.merge_into_block(core_id, start_time, exection_time)
+		else:
+			self.draw_task(core_id, task_name, start_time, exection_time)
+
+	def merge_into_block(self, core_id, start_time, exection_time):
+		# Extends the block of the core if the task is within min_task_width of it
+		finish_time = start_time + exection_time
+		margin = self.min_task_width / SchedulingViewer.WIDTH
+		block = self._blocks.get(core_id)
+		if block is not None and block[0] - margin <= finish_time and start_time <= block[1] + margin:
+			block[0] = min(block[0], start_time)
+			block[1] = max(block[1], finish_time)
+			block[2] += 1
+			return
+		if block is not None:
+			self.draw_block(core_id, block[0], block[1], block[2])
+		self._blocks[core_id] = [start_time, finish_time, 1]
+
+	def flush_blocks(self):
+		for core_id, (start_time, finish_time, num_of_tasks) in sorted(self._blocks.items()):
+			self.draw_block(core_id, start_time, finish_time, num_of_tasks)
+		self._blocks = {}
+
+	def draw_block(self, core_id, start_time, finish_time, num_of_tasks):
+		x = (start_time - self.get_window_start()) * SchedulingViewer.WIDTH + SchedulingViewer.OFFSET_X
+		y = core_id * SchedulingViewer.HEIGHT + SchedulingViewer.OFFSET_Y
+		w = max((finish_time - start_time) * SchedulingViewer.WIDTH, 1)
+		block_id = "block_"+str(core_id)+"_"+str(start_time)
+
+		self.output_file.write("\t\t<rect id =\""+block_id+"\" class=\"selectable\" x=\""+str(x)+"\" y=\""+str(y)+"\" width=\""+str(w)+"\" height=\""+str(SchedulingViewer.HEIGHT - 10)+"\" stroke=\"none\" fill=\"Gray\" />\n")
+		self.output_file.write("\t\t<text id =\""+block_id+"-info\" x=\""+str(x)+"\" y=\""+str(y + SchedulingViewer.FONT_SIZE + SchedulingViewer.HEIGHT / 2)+"\" width=\""+str(w + SchedulingViewer.OFFSET_X)+"\" font-family=\"Verdana\" font-size=\""+str(SchedulingViewer.FONT_SIZE)+"\" stroke=\"blue\" opacity=\"0.0\">")
+		self.output_file.write(str(num_of_tasks)+" tasks "+str(start_time)+"~"+str(finish_time)+"@"+str(core_id)+"</text>\n")
 
 	def draw_lines(self, height, width):
-		output_file = open(self.output_filename, "a")
+		output_file = self.output_file
+		window_start = self.get_window_start()
+		first_line = -(-window_start // SchedulingViewer.X_UNIT)
 		n = int(width / SchedulingViewer.X_UNIT) + 2
-		for i in range(n):
-			x = i * SchedulingViewer.X_UNIT * SchedulingViewer.WIDTH + SchedulingViewer.OFFSET_X
+		for i in range(first_line, first_line + n):
+			x = (i * SchedulingViewer.X_UNIT - window_start) * SchedulingViewer.WIDTH + SchedulingViewer.OFFSET_X
 			text_x = i * SchedulingViewer.X_UNIT
 
 			output_file.write("\t\t<line id =\"line_"+str(text_x)+"\" class=\"selectable\" x1=\""+str(x)+"\" y1=\"0\" x2=\""+str(x)+"\" y2=\""+str(height)+"\" stroke-width=\"15\" stroke=\"black\" />\n")
@@ -65,14 +188,14 @@ class SchedulingViewer:
 		"""
 
 	def draw_task(self, core_id, task_name, start_time, exection_time):
-		output_file = open(self.output_filename, "a")
+		output_file = self.output_file
 
 		if task_name not in self.color_hash:
 			self.color_hash[task_name] = SchedulingViewer.color_list[self.color_count] 
 			self.color_count = (self.color_count + 1) % len(SchedulingViewer.color_list)
 
 		color = self.color_hash[task_name]
-		x = start_time * SchedulingViewer.WIDTH + SchedulingViewer.OFFSET_X
+		x = (start_time - self.get_window_start()) * SchedulingViewer.WIDTH + SchedulingViewer.OFFSET_X
 		y = core_id * SchedulingViewer.HEIGHT + SchedulingViewer.OFFSET_Y
 		w = exection_time * SchedulingViewer.WIDTH
 
@@ -82,10 +205,9 @@ class SchedulingViewer:
 		output_file.write("\t\t<text id =\""+str(task_name)+"_"+str(start_time)+"-info\" x=\""+str(x)+"\" y=\""+str(y + SchedulingViewer.FONT_SIZE + SchedulingViewer.HEIGHT / 2)+"\" width=\""+str(w + SchedulingViewer.OFFSET_X)+"\" font-family=\"Verdana\" font-size=\""+str(SchedulingViewer.FONT_SIZE)+"\" stroke=\"blue\" opacity=\"0.0\">")
 		#puts  "#{task_name}@#{core_id}:#{start_time}~#{start_time+exection_time}</text>"
 		output_file.write(str(start_time)+"~"+str(start_time+exection_time)+"@"+str(core_id)+"</text>\n")
-		output_file.close()
 
 	def print_style(self):
-		output_file = open(self.output_filename, "a")
+		output_file = self.output_file
 		output_file.write("\t\t<style>\n")
 		output_file.write("\t\t.selectable:hover {\n")
 		output_file.write("\t\t\tfill: orange;\n")
@@ -95,24 +217,20 @@ class SchedulingViewer:
 		output_file.write("\t\t\topacity: 1;\n")
 		output_file.write("\t\t}\n")
 		output_file.write("\t\t</style>\n")
-		output_file.close()
 
 	def write_header(self, height, width):
-		output_file = open(self.output_filename, "w")
+		output_file = self.output_file
 		output_file.write("<html>\n")
 		output_file.write("\t<body>\n")
-		output_file.close()
 
 		self.print_style()
 		
-		output_file = open(self.output_filename, "a")
 		output_file.write("\t<!DOCTYPE svg PUBLIC \"-//W3C//DTD SVG 1.1//EN\" \"http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd\">\n")
 		#puts "\t<svg width=\"#{width}\" height=\"#{height}\"  xmlns=\"http://www.w3.org/2000/svg\" xmlns:xlink=\"http://www.w3.org/1999/xlink\">"
 		output_file.write("\t<svg width=\""+str(width)+"\" height=\""+str(height)+"\" viewBox=\"0 0 "+str(height)+" "+str(width)+"\" xmlns=\"http://www.w3.org/2000/svg\" xmlns:xlink=\"http://www.w3.org/1999/xlink\">\n")
-		output_file.close()
 
 	def write_script(self):
-		output_file = open(self.output_filename, "a")
+		output_file = self.output_file
 		output_file.write("\t\t<script>\n")
 		output_file.write("\t\tlet selectableElements = document.getElementsByClassName(\"selectable\");\n")
 		output_file.write("\t\tArray.from( selectableElements ).forEach(elem => {\n")
@@ -132,14 +250,12 @@ class SchedulingViewer:
 		output_file.write("\t\t\t});\n")
 		output_file.write("\t\t});\n")
 		output_file.write("\t\t</script>\n")
-		output_file.close()
 
 	def write_footer(self):
-		output_file = open(self.output_filename, "a")
+		output_file = self.output_file
 		output_file.write("\t\t</svg>\n")
 		output_file.write("\t</body>\n")
 		output_file.write("</html>\n")
-		output_file.close()
 
 """
 opt = OptionParser.new
@@ -149,14 +265,24 @@ opt.parse!(ARGV)
 p ARGV
 """
 
-input_file = argv[1] if len(argv) > 1 else "sample.json"
-output_file = argv[2] if len(argv) > 2 else "output.html"
-ex_rate = float(argv[3]) if len(argv) > 3 else 0
+def option_parser():
+	arg_parser = argparse.ArgumentParser()
+	arg_parser.add_argument('input_file', nargs='?', default="sample.json", help='path to schedule file (.json).')
+	arg_parser.add_argument('output_file', nargs='?', default="output.html", help='path to output file (.html).')
+	arg_parser.add_argument('ex_rate', nargs='?', type=float, default=0, help='horizontal scale. 0 fits the chart to the time window.')
+	arg_parser.add_argument('--time_window', type=int, nargs=2, metavar=('START', 'END'), help='render only the tasks between START and END.')
+	arg_parser.add_argument('--level_of_detail', action='store_true', help='merge tasks narrower than --min_task_width into one block per core.')
+	arg_parser.add_argument('--min_task_width', type=float, default=10.0, help='minimum width of a task drawn on its own (in SVG units).')
+
+	return arg_parser.parse_args()
+
 
-print("input_file : "+input_file)
-print("output_file: "+output_file)
-svg_viewer = SchedulingViewer(input_file, output_file, ex_rate)
-svg_viewer.print_svg()
+if __name__ == '__main__':
+	args = option_parser()
+	print("input_file : "+args.input_file)
+	print("output_file: "+args.output_file)
+	svg_viewer = SchedulingViewer(args.input_file, args.output_file, args.ex_rate, args.time_window, args.level_of_detail, args.min_task_width)
+	svg_viewer.print_svg()
 
 
 """
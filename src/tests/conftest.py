@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts and sched_lib are run from src/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
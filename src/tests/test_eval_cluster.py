@@ -0,0 +1,31 @@
+import argparse
+import os
+
+import eval_cluster
+from sched_lib.algorithms.static.num_learn import num_learn
+
+DAG_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'evaluation', 'DAGs', '40', 'dag_0.dot')
+
+
+def _run(algorithm: str, seed: int, dest_file_path: str) -> str:
+    args = argparse.Namespace(dag_file_path=DAG_FILE_PATH, algorithm=algorithm, num_of_clusters=2,
+                              num_of_cores=2, inout_ratio=2.0, processor_model='object',
+                              scheduling_policy='append', learning_engine='serial', q_table_backend='dense',
+                              num_of_workers=1, sync_interval=100, num_of_islands=1, migration_interval=5,
+                              num_of_migrants=1, migration_topology='ring', population_backend='object',
+                              q_table_mode='retrain', fine_tuning_ratio=0.2, seed=seed, q_table_store=None,
+                              warm_start_ratio=0.2, convergence_check=None, check_interval=500,
+                              convergence_window=3, checkpoint_path=None, checkpoint_interval=None, ccr=None,
+                              ccr_method='iterative', write_makespan=True, write_duration=False,
+                              dest_file_path=dest_file_path)
+    eval_cluster.main(args)
+    with open(dest_file_path) as f:
+        return f.readlines()[-1]
+
+
+def test_same_seed_gives_same_makespan(tmp_path, monkeypatch):
+    monkeypatch.setitem(num_learn, '40', 50)
+    dest_file_path = str(tmp_path / 'result.csv')
+    for algorithm in ['QL-HEFT', 'CQGA-HEFT']:
+        assert _run(algorithm, 1, dest_file_path) == _run(algorithm, 1, dest_file_path)
@@ -0,0 +1,32 @@
+import random
+import networkx as nx
+
+from sched_lib.processors.homogeneous.cluster import CluesteredProcessor
+from sched_lib.processors.homogeneous.array_cluster import ArrayClusteredProcessor
+from sched_lib.scheduler.list_scheduler import ListSchedulerToClusteredProcessor
+
+
+def _random_dag(rnd: random.Random, num_of_nodes: int) -> nx.DiGraph:
+    G = nx.DiGraph()
+    for node_i in range(num_of_nodes):
+        G.add_node(node_i, exec=rnd.choice([0, 0, 1, 3, 10]))
+    for node_i in range(num_of_nodes):
+        for succ_i in range(node_i+1, num_of_nodes):
+            if(rnd.random() < 0.15):
+                G.add_edge(node_i, succ_i, comm=rnd.choice([0, 2, 5]))
+    return G
+
+
+def test_array_processor_matches_object_processor_with_zero_exec_nodes():
+    for trial in range(100):
+        rnd = random.Random(trial)
+        G = _random_dag(rnd, rnd.randint(5, 40))
+        sched_list = list(nx.topological_sort(G))
+        num_of_clusters, num_of_cores = rnd.randint(1, 3), rnd.randint(1, 4)
+        records = []
+        for P in [CluesteredProcessor(num_of_clusters, num_of_cores, 2.0),
+                  ArrayClusteredProcessor(num_of_clusters, num_of_cores, 2.0)]:
+            S = ListSchedulerToClusteredProcessor(G, P, sched_list)
+            S.schedule()
+            records.append(S.sched_log.records.tolist())
+        assert records[0] == records[1]
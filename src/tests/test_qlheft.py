@@ -0,0 +1,39 @@
+import random
+import networkx as nx
+import numpy as np
+
+from sched_lib.algorithms.static.QLHEFT import QLHEFT
+
+
+def _random_dag(rnd: random.Random, num_of_nodes: int) -> nx.DiGraph:
+    # Nodes are added in a shuffled order, so node labels and CompiledDAG indices differ
+    G = nx.DiGraph()
+    for node_i in rnd.sample(range(num_of_nodes), num_of_nodes):
+        G.add_node(node_i, exec=rnd.randint(1, 20))
+    for node_i in range(num_of_nodes):
+        for succ_i in range(node_i+1, num_of_nodes):
+            if(rnd.random() < 0.2):
+                G.add_edge(node_i, succ_i, comm=rnd.randint(1, 20))
+    return G
+
+
+def _learn_sched_list(G: nx.DiGraph, learning_engine: str) -> list:
+    np.random.seed(0)
+    qlheft = QLHEFT(G, 1.0, 0.2, learning_engine)
+    qlheft.learn(200)
+    return qlheft.get_sched_list()
+
+
+def test_sched_list_of_non_contiguous_labels():
+    for trial in range(10):
+        rnd = random.Random(trial)
+        G = _random_dag(rnd, rnd.randint(5, 30))
+        # Labelled from 1 with gaps (the node labelled G.number_of_nodes() exists)
+        mapping = {node_i: 3*node_i + 1 for node_i in G.nodes}
+        H = nx.relabel_nodes(G, mapping)
+        for learning_engine in ['serial', 'batch']:
+            sched_list = _learn_sched_list(G, learning_engine)
+            assert sorted(sched_list) == sorted(G.nodes)
+            position = {node_i: k for k, node_i in enumerate(sched_list)}
+            assert all(position[s] < position[t] for s, t in G.edges)
+            assert _learn_sched_list(H, learning_engine) == [mapping[node_i] for node_i in sched_list]
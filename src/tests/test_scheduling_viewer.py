@@ -0,0 +1,36 @@
+import json
+import re
+
+from sched_lib.scheduling_viewer import SchedulingViewer
+
+
+def _write_schedule(path, tasks) -> None:
+    with open(path, 'w') as f:
+        json.dump({'coreNum': 2, 'makespan': 100,
+                   'taskSet': [{'coreID': core_id, 'taskName': f'task_{i}', 'startTime': start_time, 'executionTime': exec_time}
+                               for i, (core_id, start_time, exec_time) in enumerate(tasks)]}, f)
+
+
+def test_iter_tasks_across_chunk_boundaries(tmp_path, monkeypatch):
+    monkeypatch.setattr(SchedulingViewer, 'WIDTH', SchedulingViewer.WIDTH)
+    tasks = [(i % 2, 3*i, 2) for i in range(30)]
+    path = tmp_path / 'sched.json'
+    _write_schedule(path, tasks)
+    viewer = SchedulingViewer(str(path), str(tmp_path / 'sched.html'), 1)
+    text = path.read_text()
+    # Every chunk size, including chunks that end right after "taskSet"
+    for chunk_size in [1, 2, 3, text.index('"taskSet"') + len('"taskSet"'), 64, 1 << 20]:
+        monkeypatch.setattr(SchedulingViewer, 'READ_CHUNK_SIZE', chunk_size)
+        assert [(task['coreID'], task['startTime'], task['executionTime']) for task in viewer.iter_tasks()] == tasks
+
+
+def test_level_of_detail_block_spans_merged_tasks(tmp_path, monkeypatch):
+    monkeypatch.setattr(SchedulingViewer, 'WIDTH', SchedulingViewer.WIDTH)
+    # A long task is merged first, then tasks that start later but finish earlier
+    tasks = [(1, 10, 8), (1, 12, 1), (1, 14, 1), (1, 9, 1)]
+    path = tmp_path / 'sched.json'
+    _write_schedule(path, tasks)
+    viewer = SchedulingViewer(str(path), str(tmp_path / 'sched.html'), 1, level_of_detail=True, min_task_width=1000.0)
+    viewer.print_svg()
+    blocks = re.findall(r'(\d+) tasks (\d+)~(\d+)@1<', (tmp_path / 'sched.html').read_text())
+    assert blocks == [('4', '9', '18')]